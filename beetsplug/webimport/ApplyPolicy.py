@@ -0,0 +1,214 @@
+"""Rules for deciding on looked up tasks without asking the user: apply
+the best candidate, import the task as is or skip it when the candidates'
+distances, the penalties of the best one, its track count and the
+duplicates in the library meet the rule's conditions.
+"""
+from beets import config
+from beets.importer import SingletonImportTask
+
+from beetsplug.webimport.CandidateList import CandidateList
+
+ACTIONS = ('apply', 'asIs', 'skip')
+TRACKS = ('any', 'exact')
+DUPLICATES = ('no', 'yes', 'any')
+
+
+def _distance(candidates, index):
+    """The distance of candidate `index`, without unpacking it from a
+    `CandidateList`.
+    """
+    if isinstance(candidates, CandidateList) and \
+            index >= len(candidates.full):
+        return candidates.summaries[index - len(candidates.full)].distance
+    return candidates[index].distance.distance
+
+
+def _names(value):
+    if isinstance(value, str):
+        return frozenset([value])
+    return frozenset(value)
+
+
+def _ident(task, match):
+    """The artist and album or title that the task gets with `match`, its
+    current ones for None.
+    """
+    if isinstance(task, SingletonImportTask):
+        if match is None:
+            return task.item.artist, task.item.title
+        return match.info.artist, match.info.title
+    if match is None:
+        return task.cur_artist, task.cur_album
+    return match.info.artist, match.info.album
+
+
+class ApplyRule(object):
+    """Decides on a task with `action` if the best candidate is at most
+    `max_distance` away and at least `min_gap` closer than the next one,
+    has no penalties but `allow_penalties` (if given) and none of
+    `deny_penalties`, has neither missing nor extra tracks (with
+    `tracks: exact`), and the library has duplicates of the result or
+    not, as `duplicates` demands.
+    """
+
+    def __init__(self, name, action='apply', max_distance=None,
+                 min_gap=None, allow_penalties=None, deny_penalties=(),
+                 tracks='any', duplicates='no'):
+        if action not in ACTIONS:
+            raise ValueError(u'rule {0}: action must be one of {1}'
+                             .format(name, u', '.join(ACTIONS)))
+        if tracks not in TRACKS:
+            raise ValueError(u'rule {0}: tracks must be one of {1}'
+                             .format(name, u', '.join(TRACKS)))
+        if duplicates not in DUPLICATES:
+            raise ValueError(u'rule {0}: duplicates must be one of {1}'
+                             .format(name, u', '.join(DUPLICATES)))
+        self.name = name
+        self.action = action
+        self.max_distance = None if max_distance is None \
+            else float(max_distance)
+        self.min_gap = None if min_gap is None else float(min_gap)
+        self.allow_penalties = None if allow_penalties is None \
+            else _names(allow_penalties)
+        self.deny_penalties = _names(deny_penalties)
+        self.tracks = tracks
+        self.duplicates = duplicates
+
+    @classmethod
+    def from_dict(cls, data, index=0):
+        """Make a rule of a config or request dict; unnamed rules are
+        called `rule<index>`.
+        """
+        if not isinstance(data, dict):
+            raise ValueError(u'rule {0} is not a dict'.format(index))
+        data = dict(data)
+        name = str(data.pop('name', u'rule{0}'.format(index)))
+        try:
+            return cls(name, **data)
+        except TypeError as exc:
+            raise ValueError(u'rule {0}: {1}'.format(name, exc))
+
+    def _needs_candidate(self):
+        return self.action == 'apply' or self.max_distance is not None or \
+            self.min_gap is not None or self.allow_penalties is not None or \
+            self.deny_penalties or self.tracks != 'any'
+
+    def _candidate_ok(self, task):
+        candidates = task.candidates
+        best = _distance(candidates, 0)
+        if self.max_distance is not None and best > self.max_distance:
+            return False
+        if self.min_gap is not None and len(candidates) > 1 and \
+                _distance(candidates, 1) - best < self.min_gap:
+            return False
+        penalties = set(candidates[0].distance.keys())
+        if self.allow_penalties is not None and \
+                not penalties <= self.allow_penalties:
+            return False
+        if penalties & self.deny_penalties:
+            return False
+        if self.tracks == 'exact' and task.is_album and \
+                (candidates[0].extra_items or candidates[0].extra_tracks):
+            return False
+        return True
+
+    def matches(self, session, task):
+        if not task.candidates:
+            if self._needs_candidate():
+                return False
+        elif not self._candidate_ok(task):
+            return False
+        if self.duplicates == 'any':
+            return True
+        match = None
+        if self.action != 'asIs' and task.candidates:
+            match = task.candidates[0]
+        found = session.find_duplicates(task, _ident(task, match))
+        return bool(found) == (self.duplicates == 'yes')
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'action': self.action,
+            'max_distance': self.max_distance,
+            'min_gap': self.min_gap,
+            'allow_penalties': None if self.allow_penalties is None
+            else sorted(self.allow_penalties),
+            'deny_penalties': sorted(self.deny_penalties),
+            'tracks': self.tracks,
+            'duplicates': self.duplicates,
+        }
+
+
+class ApplyPolicy(object):
+    """The `rules` tried in order on a task; the first that matches
+    decides on it.
+    """
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+
+    @classmethod
+    def from_list(cls, rules):
+        if not isinstance(rules, list):
+            raise ValueError(u'the rules are not a list')
+        return cls(ApplyRule.from_dict(rule, index)
+                   for index, rule in enumerate(rules))
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    def match(self, session, task):
+        """The first rule matching `task`, None if none does."""
+        for rule in self.rules:
+            if rule.matches(session, task):
+                return rule
+        return None
+
+    def decisions(self, session):
+        """The decisions of the rules on the pending tasks of `session`,
+        as `(task_id, action, candidate_index)`.
+        """
+        decisions = []
+        for task_id in session.tasks.snapshot():
+            with session.tasks.lock(task_id):
+                task = session.tasks.get(task_id)
+                rule = task and self.match(session, task)
+            if rule:
+                decisions.append((task_id, rule.action,
+                                  0 if rule.action == 'apply' else None))
+        return decisions
+
+    def dry_run(self, session):
+        """Report for every rule the pending tasks of `session` it would
+        decide on, being the first to match them, and how many it matches
+        in all.
+        """
+        report = [dict(rule.as_dict(), tasks=[], matches=0)
+                  for rule in self.rules]
+        pending = 0
+        for task_id in session.tasks.snapshot():
+            with session.tasks.lock(task_id):
+                task = session.tasks.get(task_id)
+                if not task:
+                    continue
+                pending += 1
+                first = True
+                for rule, entry in zip(self.rules, report):
+                    if rule.matches(session, task):
+                        entry['matches'] += 1
+                        if first:
+                            entry['tasks'].append(task_id)
+                            first = False
+        for entry in report:
+            entry['cleared'] = len(entry['tasks'])
+        return {
+            'pending': pending,
+            'remaining': pending - sum(e['cleared'] for e in report),
+            'rules': report,
+        }
+
+
+def apply_policy():
+    """Return the policy of the `auto_apply` rules in the config."""
+    return ApplyPolicy.from_list(config['webimport']['auto_apply'].get(list))
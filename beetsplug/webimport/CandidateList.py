@@ -0,0 +1,90 @@
+"""A compact form of the candidates of pending tasks. Only the best
+candidates are kept as they are; the others are kept as small summaries
+for the task list and one compressed pickle from which they are unpacked
+when they are needed.
+"""
+import collections.abc
+import pickle
+import zlib
+
+from beetsplug.webimport.LookupCache import pack_candidates, \
+    unpack_candidates
+
+# The info fields the task list shows of a candidate.
+SUMMARY_FIELDS = ('artist', 'album', 'title', 'album_id', 'track_id',
+                  'data_source', 'data_url', 'media', 'mediums', 'year',
+                  'country', 'label', 'catalognum', 'albumdisambig')
+
+
+class CandidateSummary(object):
+    """The distance, the names of the penalties and the `SUMMARY_FIELDS`
+    of the info of a candidate.
+    """
+    __slots__ = ('distance', 'penalties', 'info')
+
+    def __init__(self, match):
+        self.distance = match.distance.distance
+        self.penalties = tuple(match.distance.keys())
+        self.info = dict((key, match.info.get(key)) for key in SUMMARY_FIELDS
+                         if match.info.get(key) is not None)
+
+
+class CandidateList(collections.abc.Sequence):
+    """The candidates of a task with the items `items`, of which the
+    first `full` are kept as they are. The others are unpacked from the
+    pickle whenever they are accessed; one accessed by index stays
+    unpacked, so that it is the same object when it is chosen as the
+    task's match.
+    """
+    __slots__ = ('_items', '_full', '_summaries', '_packed', '_expanded')
+
+    def __init__(self, items, candidates, full=1):
+        candidates = list(candidates)
+        self._items = items
+        self._full = candidates[:full]
+        rest = candidates[full:]
+        self._summaries = [CandidateSummary(c) for c in rest]
+        self._packed = None
+        if rest:
+            self._packed = zlib.compress(pickle.dumps(
+                pack_candidates(items, rest), pickle.HIGHEST_PROTOCOL))
+        self._expanded = dict()
+
+    @property
+    def full(self):
+        return self._full
+
+    @property
+    def summaries(self):
+        return self._summaries
+
+    @property
+    def packed_size(self):
+        return len(self._packed) if self._packed else 0
+
+    def _unpack(self):
+        return unpack_candidates(self._items,
+                                 pickle.loads(zlib.decompress(self._packed)))
+
+    def __len__(self):
+        return len(self._full) + len(self._summaries)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(u'candidate index out of range')
+        if index < len(self._full):
+            return self._full[index]
+        index -= len(self._full)
+        if index not in self._expanded:
+            self._expanded[index] = self._unpack()[index]
+        return self._expanded[index]
+
+    def __iter__(self):
+        yield from self._full
+        if self._summaries:
+            for i, candidate in enumerate(self._unpack()):
+                yield self._expanded.get(i, candidate)
@@ -0,0 +1,81 @@
+"""Compression of the JSON and text responses with brotli, if the
+`brotli` module is installed, or gzip.
+"""
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Smaller bodies are sent as they are.
+MIN_SIZE = 500
+COMPRESSIBLE = ('application/json', 'application/javascript', 'text/')
+
+
+def choose_encoding(accept_encodings):
+    """Return the content coding to use for a request accepting
+    `accept_encodings`, None for none.
+    """
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def _compressor(encoding):
+    """Return the `(compress, flush)` functions of a compressor."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=5)
+        return compressor.process, compressor.finish
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress, compressor.flush
+
+
+def _compress_stream(chunks, encoding):
+    compress, flush = _compressor(encoding)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = compress(chunk)
+        if data:
+            yield data
+    yield flush()
+
+
+def compress_response(response, encoding):
+    """Compress the body of `response` with `encoding`. Event streams,
+    files and small or already encoded bodies are left alone. The ETag
+    of a compressed response gets the encoding appended, also for a 304
+    answer, so that it differs from the ETag of the plain body.
+    """
+    if not response.mimetype or \
+            not response.mimetype.startswith(COMPRESSIBLE) or \
+            response.mimetype == 'text/event-stream' or \
+            response.direct_passthrough or \
+            'Content-Encoding' in response.headers:
+        return response
+    response.vary.add('Accept-Encoding')
+    if encoding is None:
+        return response
+    etag, weak = response.get_etag()
+    if response.status_code == 304:
+        if etag:
+            response.set_etag('{0}-{1}'.format(etag, encoding), weak)
+        return response
+    if response.status_code != 200:
+        return response
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < MIN_SIZE:
+            return response
+        compress, flush = _compressor(encoding)
+        response.set_data(compress(data) + flush())
+    response.headers['Content-Encoding'] = encoding
+    if etag:
+        response.set_etag('{0}-{1}'.format(etag, encoding), weak)
+    return response
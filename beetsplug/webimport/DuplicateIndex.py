@@ -0,0 +1,103 @@
+"""An in-memory index of the library's albums and items by the fields
+beets compares to find duplicates, so checking a task does not query the
+library unless it has a duplicate.
+"""
+import threading
+
+from beets.importer import SingletonImportTask
+from beets.library import Album
+
+
+class DuplicateIndex(object):
+    """Maps `(albumartist, album)` to album ids and `(artist, title)` to
+    item ids. The index is read from `lib` on first use and kept up to
+    date with `add`. Removed objects are dropped when a lookup finds
+    them gone.
+    """
+
+    def __init__(self, lib):
+        self.lib = lib
+        self._albums = None
+        self._items = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._albums is not None:
+            return
+        albums = dict()
+        items = dict()
+        with self.lib.transaction() as tx:
+            for album_id, artist, album in tx.query(
+                    'SELECT id, albumartist, album FROM albums'):
+                albums.setdefault((artist, album), set()).add(album_id)
+            for item_id, artist, title in tx.query(
+                    'SELECT id, artist, title FROM items'):
+                items.setdefault((artist, title), set()).add(item_id)
+        self._albums = albums
+        self._items = items
+
+    def add(self, obj):
+        """Add the imported item or album `obj`, with the items of an
+        album.
+        """
+        with self._lock:
+            if self._albums is None:
+                return
+            if isinstance(obj, Album):
+                self._albums.setdefault((obj.albumartist, obj.album),
+                                        set()).add(obj.id)
+                items = obj.items()
+            else:
+                items = [obj]
+            for item in items:
+                self._items.setdefault((item.artist, item.title),
+                                       set()).add(item.id)
+
+    def _ids(self, index, key):
+        with self._lock:
+            self._load()
+            return set(getattr(self, index).get(key, ()))
+
+    def _forget(self, index, key, obj_id):
+        with self._lock:
+            getattr(self, index).get(key, set()).discard(obj_id)
+
+    def find_duplicates(self, task, ident=None):
+        """Return what `task.find_duplicates(lib)` returns, querying the
+        library only for the objects the index has under the task's key.
+        `ident` replaces the `chosen_ident()` of the task.
+        """
+        ident = ident or task.chosen_ident()
+        if isinstance(task, SingletonImportTask):
+            return self._find_items(task, ident)
+        return self._find_albums(task, ident)
+
+    def _find_albums(self, task, ident):
+        artist, album = ident
+        if artist is None:
+            # As-is import with no artist. Skip check.
+            return []
+        key = (artist, album)
+        task_paths = {i.path for i in task.items if i}
+        duplicates = []
+        for album_id in sorted(self._ids('_albums', key)):
+            found = self.lib.get_album(album_id)
+            if found is None or (found.albumartist, found.album) != key:
+                self._forget('_albums', key, album_id)
+                continue
+            # An album whose files are all re-imported by the task will
+            # be replaced, it is no duplicate.
+            if not ({i.path for i in found.items()} <= task_paths):
+                duplicates.append(found)
+        return duplicates
+
+    def _find_items(self, task, key):
+        duplicates = []
+        for item_id in sorted(self._ids('_items', key)):
+            found = self.lib.get_item(item_id)
+            if found is None or (found.artist, found.title) != key:
+                self._forget('_items', key, item_id)
+                continue
+            if found.path != task.item.path:
+                duplicates.append(found)
+        return duplicates
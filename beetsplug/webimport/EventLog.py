@@ -0,0 +1,46 @@
+"""A sequence-numbered log of task lifecycle events, from which the
+`/api/events` stream sends clients only what changed since they last
+heard from the server.
+"""
+import collections
+import threading
+
+ADDED = 'added'
+CANDIDATES = 'candidates'
+CHANGED = 'changed'
+IMPORTED = 'imported'
+SKIPPED = 'skipped'
+# Reports a finished search job, the event's id is the job's id.
+SEARCH = 'search'
+
+
+class EventLog(object):
+    """Keeps the most recent `maxlen` events of a session. Every event
+    gets the next sequence number, so a client that reconnects can ask
+    for everything after the last number it has seen.
+    """
+
+    def __init__(self, maxlen=10000):
+        self.seq = 0
+        self._events = collections.deque(maxlen=maxlen)
+        self._cond = threading.Condition()
+
+    def emit(self, kind, task_id):
+        with self._cond:
+            self.seq += 1
+            self._events.append((self.seq, kind, task_id))
+            self._cond.notify_all()
+
+    def since(self, seq, timeout=None):
+        """Return the `(seq, kind, task_id)` events newer than `seq`,
+        waiting up to `timeout` seconds for one to arrive. Returns None
+        if the events after `seq` are no longer available, in which case
+        the client has to fetch a new snapshot.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self.seq != seq, timeout)
+            if seq > self.seq:
+                return None
+            if self._events and seq < self._events[0][0] - 1:
+                return None
+            return [e for e in self._events if e[0] > seq]
@@ -0,0 +1,102 @@
+"""In-memory index of the distinct values of library fields, for the
+autocompletion of the search dialogs.
+"""
+import bisect
+import threading
+
+from beets.library import Album, Item
+
+
+def _fold(value):
+    return str(value).lower()
+
+
+class FieldValues(object):
+    """The distinct values of one field, sorted like SQLite sorts them,
+    and sorted by their lower case text for prefix lookups.
+    """
+
+    def __init__(self, values):
+        self._values = set(values)
+        self._sorted = None
+        self._folded = None
+
+    def add(self, value):
+        if value not in self._values:
+            self._values.add(value)
+            self._sorted = self._folded = None
+
+    def sorted(self):
+        if self._sorted is None:
+            self._sorted = sorted(self._values,
+                                  key=lambda v: (v is not None, v))
+        return self._sorted
+
+    def prefixed(self, prefix, limit=None):
+        """Return the values starting with `prefix`, ignoring case."""
+        if self._folded is None:
+            self._folded = sorted((_fold(v), v) for v in self._values
+                                  if v is not None)
+        prefix = _fold(prefix)
+        start = bisect.bisect_left(self._folded, (prefix,))
+        out = []
+        for folded, value in self._folded[start:]:
+            if not folded.startswith(prefix) or \
+                    (limit is not None and len(out) >= limit):
+                break
+            out.append(value)
+        return out
+
+
+class FieldIndex(object):
+    """Keeps the distinct values of the fixed fields of items and albums
+    in `lib`. A field is read from the database the first time it is
+    asked for and then kept up to date from the objects passed to `add`,
+    i.e. the imported ones. Values of removed objects are kept.
+    """
+
+    def __init__(self, lib):
+        self.lib = lib
+        self._fields = dict()
+        self._lock = threading.Lock()
+
+    def _get(self, model, field):
+        if field not in model._fields:
+            raise KeyError(field)
+        key = (model, field)
+        with self._lock:
+            if key not in self._fields:
+                with self.lib.transaction() as tx:
+                    rows = tx.query('SELECT DISTINCT "{0}" FROM "{1}"'
+                                    .format(field, model._table))
+                self._fields[key] = FieldValues(row[0] for row in rows)
+            return self._fields[key]
+
+    def values(self, model, field):
+        """Return the distinct values of `field` in `model`'s table in
+        ascending order.
+        """
+        values = self._get(model, field)
+        with self._lock:
+            return list(values.sorted())
+
+    def prefixed(self, model, field, prefix, limit=None):
+        values = self._get(model, field)
+        with self._lock:
+            return values.prefixed(prefix, limit)
+
+    def add(self, obj):
+        """Add the values of the imported item or album `obj`, and of the
+        items of an album.
+        """
+        objs = [obj]
+        if isinstance(obj, Album):
+            objs += list(obj.items())
+        with self._lock:
+            for (model, field), values in self._fields.items():
+                for o in objs:
+                    if isinstance(o, model):
+                        values.add(model._type(field).to_sql(o.get(field)))
+
+
+MODELS = {'items': Item, 'albums': Album}
@@ -0,0 +1,124 @@
+"""Runs import sessions in the background so that web requests which start
+an import can return right away.
+"""
+import itertools
+import queue
+import threading
+
+from beets import config, logging
+
+from beetsplug.webimport.Profiler import profiler
+
+FAILED = 'failed'
+
+log = logging.getLogger('beets')
+
+
+class ImportJob(object):
+    """A `WebImporter` session that was submitted to a `JobRunner`. Once
+    the session ran, the job keeps its counts and lets go of it.
+    """
+
+    def __init__(self, job_id, session):
+        self.id = job_id
+        self.session = session
+        self.session_id = session.id
+        self.error = None
+        self.scanned = 0
+        self.looked_up = 0
+        self._state = None
+
+    @property
+    def state(self):
+        if self.error is not None:
+            return FAILED
+        if self.session is None:
+            return self._state
+        return self.session.state
+
+    def run(self):
+        try:
+            with profiler(self.session_id):
+                self.session.run()
+        except Exception as exc:
+            log.error(u'import job {0} failed: {1}', self.id, exc)
+            self.error = str(exc)
+        finally:
+            self.finish()
+
+    def finish(self):
+        """Keep the counts of the session and let go of it."""
+        session = self.session
+        self.scanned = session.scanned
+        self.looked_up = session.looked_up
+        self._state = session.state
+        self.session = None
+
+    def as_dict(self, session=None):
+        """The job's state; `session` gives the pending tasks once the
+        job let go of its session.
+        """
+        session = self.session or session
+        return {
+            'id': self.id,
+            'session': self.session_id,
+            'state': self.state,
+            'scanned': session.scanned if session else self.scanned,
+            'looked_up': session.looked_up if session else self.looked_up,
+            'pending': len(session.tasks) if session else None,
+            'error': self.error,
+        }
+
+
+class JobRunner(object):
+    """Executes submitted import jobs on `scan_workers` background
+    threads. Jobs wait in the `queued` state until a thread picks them up
+    and are forgotten once they are done or failed.
+    """
+
+    def __init__(self):
+        self.jobs = dict()
+        self._ids = itertools.count(1)
+        self._queue = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def submit(self, session):
+        job = ImportJob(str(next(self._ids)), session)
+        with self._lock:
+            self.jobs[job.id] = job
+        self._queue.put(job)
+        with self._lock:
+            if not self._threads:
+                workers = config['webimport']['scan_workers'].get(int)
+                for i in range(max(workers, 1)):
+                    thread = threading.Thread(
+                        target=self._work,
+                        name='webimport-jobs-{0}'.format(i), daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def drop(self, session):
+        """Forget the jobs of `session`; queued ones are not run."""
+        with self._lock:
+            for job in list(self.jobs.values()):
+                if job.session is session:
+                    del self.jobs[job.id]
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                dropped = job.id not in self.jobs
+            if dropped:
+                job.finish()
+            else:
+                job.run()
+            with self._lock:
+                self.jobs.pop(job.id, None)
+            self._queue.task_done()
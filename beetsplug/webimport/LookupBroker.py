@@ -0,0 +1,104 @@
+"""Funnels the metadata source lookups of all sessions through one place,
+so they stay below the source's rate limit, identical lookups running at
+the same time are made once, and searches of users go before background
+lookups.
+"""
+import threading
+import time
+from concurrent.futures import Future
+
+from beets import config
+
+
+class TokenBucket(object):
+    """Allows `rate` acquisitions per second on average and bursts of up
+    to `burst`. Interactive callers are served before background callers
+    waiting at the same time. A rate of 0 disables the limit.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._interactive = 0
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst,
+                           self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, interactive=False):
+        if not self.rate:
+            return
+        with self._cond:
+            if interactive:
+                self._interactive += 1
+            try:
+                while True:
+                    self._refill()
+                    if self._tokens >= 1 and \
+                            (interactive or not self._interactive):
+                        self._tokens -= 1
+                        return
+                    wait = max((1 - self._tokens) / self.rate, 0.001)
+                    self._cond.wait(wait)
+            finally:
+                if interactive:
+                    self._interactive -= 1
+                    self._cond.notify_all()
+
+
+class LookupBroker(object):
+    """Runs lookups on the calling thread once the token bucket allows
+    it, one token per lookup. A lookup whose key is already being looked
+    up waits for that lookup's result instead of running again.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.bucket = TokenBucket(rate, burst)
+        self.calls = 0
+        self.coalesced = 0
+        self._in_flight = dict()
+        self._lock = threading.Lock()
+
+    def call(self, key, func, interactive=False):
+        """Return `func()`, or the result of the running call for `key`.
+        """
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+            else:
+                self.coalesced += 1
+        if owner:
+            try:
+                self.bucket.acquire(interactive)
+                self.calls += 1
+                future.set_result(func())
+            except BaseException as exc:
+                future.set_exception(exc)
+            finally:
+                with self._lock:
+                    del self._in_flight[key]
+        return future.result()
+
+    def stats(self):
+        return {'calls': self.calls, 'coalesced': self.coalesced}
+
+
+_brokers = dict()
+_brokers_lock = threading.Lock()
+
+
+def lookup_broker():
+    """Return the broker for the configured rate limit."""
+    rate = config['webimport']['lookup_rate'].as_number()
+    burst = config['webimport']['lookup_burst'].get(int)
+    with _brokers_lock:
+        if (rate, burst) not in _brokers:
+            _brokers[(rate, burst)] = LookupBroker(rate, burst)
+        return _brokers[(rate, burst)]
@@ -0,0 +1,152 @@
+"""An on-disk cache of autotagger results, so that looking at the same
+files again does not query the metadata sources again.
+"""
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from beets import config
+from beets.autotag import AlbumMatch
+from beets.library import Item
+
+
+def fingerprint(items):
+    """Hash the paths, modification times and current tags of `items`.
+    """
+    digest = hashlib.sha1()
+    for item in items:
+        try:
+            mtime = item.current_mtime()
+        except OSError:
+            mtime = None
+        digest.update(repr((item.path, mtime)).encode('utf-8'))
+        digest.update(repr([(key, item.get(key))
+                            for key in sorted(Item._media_tag_fields)])
+                      .encode('utf-8'))
+    return digest.hexdigest()
+
+
+def pack_candidates(items, candidates):
+    """Replace the items in the candidates' mappings by their index in
+    `items`, so the candidates can be pickled without the library.
+    """
+    index = dict((id(item), i) for i, item in enumerate(items))
+    packed = []
+    for candidate in candidates:
+        if isinstance(candidate, AlbumMatch):
+            candidate = candidate._replace(
+                mapping=dict((index[id(item)], track) for item, track
+                             in candidate.mapping.items()),
+                extra_items=[index[id(item)]
+                             for item in candidate.extra_items])
+        packed.append(candidate)
+    return packed
+
+
+def unpack_candidates(items, candidates):
+    """Reverse `pack_candidates` for the items of the task being
+    looked up.
+    """
+    unpacked = []
+    for candidate in candidates:
+        if isinstance(candidate, AlbumMatch):
+            candidate = candidate._replace(
+                mapping=dict((items[i], track) for i, track
+                             in candidate.mapping.items()),
+                extra_items=[items[i] for i in candidate.extra_items])
+        unpacked.append(candidate)
+    return unpacked
+
+
+class LookupCache(object):
+    """Stores lookup results in an SQLite database at `path`. Entries
+    expire `ttl` seconds after they were stored, and the least recently
+    used entries are evicted beyond `max_entries`. Results without
+    candidates are not stored, because the metadata source plugins report
+    errors, like an unreachable server, as finding nothing.
+    """
+
+    def __init__(self, path, ttl, max_entries):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute('CREATE TABLE IF NOT EXISTS lookups ('
+                             'key TEXT PRIMARY KEY, created REAL, '
+                             'accessed REAL, value BLOB)')
+
+    def key(self, kind, items, search_ids=()):
+        return '{0}:{1}:{2}'.format(kind, ' '.join(sorted(search_ids)),
+                                    fingerprint(items))
+
+    def get(self, key, items):
+        """Return the `(cur_artist, cur_album, candidates, rec)` stored
+        for `key`, with the candidates mapped onto `items`, or None.
+        """
+        now = time.time()
+        with self._lock, self._db:
+            row = self._db.execute('SELECT created, value FROM lookups '
+                                   'WHERE key = ?', (key,)).fetchone()
+            if row is None or now - row[0] > self.ttl:
+                if row is not None:
+                    self._db.execute('DELETE FROM lookups WHERE key = ?',
+                                     (key,))
+                self.misses += 1
+                return None
+            self._db.execute('UPDATE lookups SET accessed = ? '
+                             'WHERE key = ?', (now, key))
+            self.hits += 1
+        artist, album, candidates, rec = pickle.loads(row[1])
+        return artist, album, unpack_candidates(items, candidates), rec
+
+    def put(self, key, items, artist, album, candidates, rec):
+        if not candidates:
+            return
+        value = pickle.dumps((artist, album,
+                              pack_candidates(items, candidates), rec))
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute('INSERT OR REPLACE INTO lookups '
+                             'VALUES (?, ?, ?, ?)', (key, now, now, value))
+            count = self._db.execute('SELECT COUNT(*) FROM lookups')\
+                .fetchone()[0]
+            if count > self.max_entries:
+                self._db.execute('DELETE FROM lookups WHERE key IN ('
+                                 'SELECT key FROM lookups '
+                                 'ORDER BY accessed LIMIT ?)',
+                                 (count - self.max_entries,))
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+_caches = dict()
+_caches_lock = threading.Lock()
+
+
+def cache_path():
+    """The database file configured for the plugin's on-disk state."""
+    path = config['webimport']['cache_path'].as_str()
+    if not path:
+        path = os.path.join(config.config_dir(), 'webimport.db')
+    return path
+
+
+def lookup_cache():
+    """Return the configured `LookupCache`, or None if it is disabled."""
+    if not config['webimport']['lookup_cache'].get(bool):
+        return None
+    path = cache_path()
+    with _caches_lock:
+        if path not in _caches:
+            _caches[path] = LookupCache(
+                path, config['webimport']['lookup_cache_ttl'].get(int),
+                config['webimport']['lookup_cache_size'].get(int))
+        return _caches[path]
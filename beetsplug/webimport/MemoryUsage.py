@@ -0,0 +1,28 @@
+"""Estimates of the memory held by the objects of a session."""
+import gc
+import sys
+import types
+
+from beets.dbcore import Database
+
+# Objects shared with the rest of the process, which are not counted.
+_SHARED = (type, types.ModuleType, types.FunctionType, types.MethodType,
+           types.BuiltinFunctionType, Database)
+
+
+def deep_size(obj):
+    """Return the size in bytes of `obj` and of all objects it refers to,
+    each counted once, without classes, functions, modules and the
+    library.
+    """
+    seen = set()
+    size = 0
+    pending = [obj]
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen or isinstance(obj, _SHARED):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        pending.extend(gc.get_referents(obj))
+    return size
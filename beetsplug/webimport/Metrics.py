@@ -0,0 +1,163 @@
+"""Timing and queue depth counters of the import pipelines and the web
+routes, served in the Prometheus text format at `/api/metrics`.
+"""
+import contextlib
+import threading
+import time
+
+from beets.util import pipeline
+
+STAGE_SECONDS = 'webimport_stage_seconds'
+STAGE_ACTIVE = 'webimport_stage_active'
+STAGE_QUEUED = 'webimport_stage_queued'
+OPERATION_SECONDS = 'webimport_operation_seconds'
+REQUEST_SECONDS = 'webimport_request_seconds'
+AUTO_DECIDED = 'webimport_auto_decided_total'
+
+# The type and help text of each metric family.
+FAMILIES = {
+    STAGE_SECONDS: ('summary', u'Time spent in each import pipeline stage.'),
+    STAGE_ACTIVE: ('gauge', u'Tasks being handled by each pipeline stage.'),
+    STAGE_QUEUED: ('gauge',
+                   u'Tasks waiting in front of each pipeline stage.'),
+    OPERATION_SECONDS: ('summary', u'Time spent reading tags, looking up '
+                                   u'candidates and finding duplicates.'),
+    REQUEST_SECONDS: ('summary', u'Time spent answering each web route.'),
+    AUTO_DECIDED: ('counter', u'Tasks decided on by each auto-apply rule.'),
+    'webimport_pending_tasks': ('gauge', u'Pending tasks of each session.'),
+    'webimport_importing_tasks': ('gauge',
+                                  u'Tasks of each session being imported.'),
+    'webimport_lookups_total': ('counter',
+                                u'Lookups made at the metadata source.'),
+    'webimport_lookups_coalesced_total': ('counter', u'Lookups that waited '
+                                                     u'for an identical one.'),
+}
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"') \
+        .replace('\n', r'\n')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{0}="{1}"'.format(key, _escape(value))
+                          for key, value in labels) + '}'
+
+
+class Metrics(object):
+    """Summaries (count and sum of observed seconds) and gauges, each
+    keyed by a family name and a set of labels.
+    """
+
+    def __init__(self):
+        self._summaries = dict()
+        self._gauges = dict()
+        self._lock = threading.Lock()
+
+    def observe(self, family, seconds, **labels):
+        key = (family, tuple(sorted(labels.items())))
+        with self._lock:
+            entry = self._summaries.setdefault(key, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def add(self, family, value, **labels):
+        key = (family, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + value
+
+    @contextlib.contextmanager
+    def timer(self, family, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(family, time.perf_counter() - start, **labels)
+
+    def render(self, samples=()):
+        """Return the metrics, followed by the `(family, labels, value)`
+        `samples`, in the Prometheus text format.
+        """
+        lines = dict()
+        with self._lock:
+            for (family, labels), (count, total) in \
+                    sorted(self._summaries.items()):
+                lines.setdefault(family, []).extend([
+                    '{0}_count{1} {2}'.format(family, _labels(labels), count),
+                    '{0}_sum{1} {2:.6f}'.format(family, _labels(labels),
+                                                total)])
+            for (family, labels), value in sorted(self._gauges.items()):
+                lines.setdefault(family, []).append(
+                    '{0}{1} {2}'.format(family, _labels(labels), value))
+        for family, labels, value in samples:
+            lines.setdefault(family, []).append('{0}{1} {2}'.format(
+                family, _labels(sorted(labels.items())), value))
+        out = []
+        for family in sorted(lines):
+            kind, text = FAMILIES[family]
+            out.append('# HELP {0} {1}'.format(family, text))
+            out.append('# TYPE {0} {1}'.format(family, kind))
+            out.extend(lines[family])
+        return '\n'.join(out) + '\n'
+
+
+_metrics = Metrics()
+
+
+def metrics():
+    return _metrics
+
+
+def _messages(out):
+    """The number of messages a stage passes on for its output `out`."""
+    if isinstance(out, pipeline.MultiMessage):
+        return len(out.messages)
+    return 0 if out == pipeline.BUBBLE else 1
+
+
+def _timed_source(name, tasks, next_name):
+    tasks = iter(tasks)
+    while True:
+        start = time.perf_counter()
+        try:
+            task = next(tasks)
+        except StopIteration:
+            return
+        if name is not None:
+            _metrics.observe(STAGE_SECONDS, time.perf_counter() - start,
+                             stage=name)
+        if next_name is not None:
+            _metrics.add(STAGE_QUEUED, _messages(task), stage=next_name)
+        yield task
+
+
+def _timed_stage(name, coro, next_name):
+    out = next(coro)
+    while True:
+        task = yield out
+        _metrics.add(STAGE_QUEUED, -1, stage=name)
+        _metrics.add(STAGE_ACTIVE, 1, stage=name)
+        start = time.perf_counter()
+        try:
+            out = coro.send(task)
+        finally:
+            _metrics.add(STAGE_ACTIVE, -1, stage=name)
+            _metrics.observe(STAGE_SECONDS, time.perf_counter() - start,
+                             stage=name)
+        if next_name is not None:
+            _metrics.add(STAGE_QUEUED, _messages(out), stage=next_name)
+
+
+def timed_pipeline(source, tasks, stages):
+    """Return the stages of a pipeline reading `tasks` and passing them
+    through the `(name, coroutine)` pairs in `stages`, recording the time
+    spent in each stage, named `source` for the first one (not recorded
+    if it is None), and the number of tasks waiting in front of each.
+    """
+    names = [name for name, _ in stages]
+    following = names[1:] + [None]
+    return [_timed_source(source, tasks, names[0] if names else None)] + \
+        [_timed_stage(name, coro, next_name)
+         for (name, coro), next_name in zip(stages, following)]
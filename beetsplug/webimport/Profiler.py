@@ -0,0 +1,85 @@
+"""A sampling profiler for the `--profile` option of the `webimport`
+command. The import pipeline runs every stage on a thread of its own,
+which a profiler hooked into one thread does not see, so the stacks of
+all threads are sampled instead.
+"""
+import collections
+import os
+import sys
+import threading
+
+from beets import config, logging, util
+
+log = logging.getLogger('beets')
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return u'{0} ({1}:{2})'.format(code.co_name,
+                                   os.path.basename(code.co_filename),
+                                   code.co_firstlineno)
+
+
+class Profiler(object):
+    """Samples the stacks of all threads every `interval` seconds while
+    it is entered and then writes them to `path` in the folded format of
+    flame graph tools (`flamegraph.pl`, speedscope): one line per stack,
+    frames from the thread down separated by semicolons, followed by the
+    number of samples. Without a `path` it does nothing.
+    """
+
+    def __init__(self, path, interval=0.005):
+        self.path = path
+        self.interval = interval
+        self.samples = 0
+        self._stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = dict((t.ident, t.name) for t in threading.enumerate())
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self._stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def __enter__(self):
+        if self.path is None:
+            return self
+        self._thread = threading.Thread(target=self._sample,
+                                        name='webimport-profiler',
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        with open(util.syspath(self.path), 'w', encoding='utf-8') as f:
+            for stack, count in self._stacks.most_common():
+                f.write(u'{0} {1}\n'.format(stack, count))
+        log.info(u'webimport: wrote {0} profile samples to {1}',
+                 self.samples, util.displayable_path(self.path))
+
+
+def profiler(name):
+    """Return a `Profiler` writing `<name>.folded` to the `profile`
+    directory, which does nothing if profiling is disabled.
+    """
+    directory = config['webimport']['profile'].as_str()
+    if not directory:
+        return Profiler(None)
+    directory = util.normpath(directory)
+    os.makedirs(util.syspath(directory), exist_ok=True)
+    return Profiler(os.path.join(directory,
+                                 util.bytestring_path(name + '.folded')))
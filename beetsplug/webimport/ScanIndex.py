@@ -0,0 +1,246 @@
+"""Scanning of the import paths. An index of the scanned files makes
+scanning an inbox again only read the tags of files that changed and only
+yield tasks for album directories that are new or changed, and several
+directories can be read at once.
+"""
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+
+from beets import config, logging
+from beets.importer import ImportTask, ImportTaskFactory, \
+    SingletonImportTask
+from beets.library import Item
+from beets.util import displayable_path, syspath
+
+from beetsplug.webimport.LookupCache import cache_path
+from beetsplug.webimport.Metrics import OPERATION_SECONDS, metrics
+
+log = logging.getLogger('beets')
+
+
+def file_stats(paths):
+    """Map `paths` to their `(size, mtime)`, None for missing files."""
+    stats = dict()
+    for path in paths:
+        try:
+            st = os.stat(syspath(path))
+            stats[path] = (st.st_size, st.st_mtime)
+        except OSError:
+            stats[path] = None
+    return stats
+
+
+def signature(stats):
+    digest = hashlib.sha1()
+    for path in sorted(stats):
+        digest.update(repr((path, stats[path])).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def dir_key(dirs):
+    """The key of the album directories (or singleton file) `dirs`."""
+    return b'\0'.join(sorted(dirs))
+
+
+class ScanIndex(object):
+    """Stores the tags read from each file by `(path, size, mtime)`, and
+    for each album directory the signature of its files when it was last
+    scanned and whether its task was imported or skipped since, in an
+    SQLite database at `path`.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute('CREATE TABLE IF NOT EXISTS scan_files ('
+                             'path BLOB PRIMARY KEY, size INTEGER, '
+                             'mtime REAL, value BLOB)')
+            self._db.execute('CREATE TABLE IF NOT EXISTS scan_dirs ('
+                             'key BLOB PRIMARY KEY, signature TEXT, '
+                             'done INTEGER)')
+
+    def unchanged(self, key, sig):
+        """Whether the directories `key` were finished with files of the
+        signature `sig`.
+        """
+        with self._lock:
+            row = self._db.execute('SELECT signature, done FROM scan_dirs '
+                                   'WHERE key = ?', (key,)).fetchone()
+        return row is not None and row[0] == sig and bool(row[1])
+
+    def seen(self, key, sig):
+        """Record that the directories `key` were scanned with files of
+        the signature `sig`. A changed signature resets their finished
+        state.
+        """
+        with self._lock, self._db:
+            row = self._db.execute('SELECT signature FROM scan_dirs '
+                                   'WHERE key = ?', (key,)).fetchone()
+            if row is None or row[0] != sig:
+                self._db.execute('INSERT OR REPLACE INTO scan_dirs '
+                                 'VALUES (?, ?, 0)', (key, sig))
+
+    def finished(self, dirs):
+        """Record that the task of the directories `dirs` was imported or
+        skipped, so they are left out until their files change.
+        """
+        with self._lock, self._db:
+            self._db.execute('UPDATE scan_dirs SET done = 1 WHERE key = ?',
+                             (dir_key(dirs),))
+
+    def items(self, stats, read_item):
+        """Return the items of the files in `stats`, in order. Files whose
+        size and mtime match the index are not read again; the others are
+        read with `read_item`, which returns None for non-music files.
+        """
+        paths = list(stats)
+        with self._lock:
+            rows = dict()
+            for start in range(0, len(paths), 500):
+                chunk = paths[start:start + 500]
+                rows.update((row[0], row[1:]) for row in self._db.execute(
+                    'SELECT path, size, mtime, value FROM scan_files '
+                    'WHERE path IN ({0})'.format(','.join('?' * len(chunk))),
+                    chunk))
+        items = []
+        fresh = []
+        for path in paths:
+            row = rows.get(path)
+            if row is not None and stats[path] == tuple(row[:2]):
+                self.hits += 1
+                values = pickle.loads(row[2]) if row[2] else None
+                items.append(Item(None, **values) if values else None)
+                continue
+            self.misses += 1
+            item = read_item(path)
+            items.append(item)
+            if stats[path] is not None:
+                value = pickle.dumps(dict(item)) if item else None
+                fresh.append((path,) + stats[path] + (value,))
+        if fresh:
+            with self._lock, self._db:
+                self._db.executemany('INSERT OR REPLACE INTO scan_files '
+                                     'VALUES (?, ?, ?, ?)', fresh)
+        return items
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+class IndexedTaskFactory(ImportTaskFactory):
+    """An `ImportTaskFactory` that skips finished directories whose files
+    did not change and takes unchanged files' tags from `index`, if one
+    is given.
+
+    The directories are read with `map`, which has to return the results
+    in order; a parallel map reads the files of several directories at
+    once. The tasks are still created and yielded on the calling thread.
+    """
+
+    def __init__(self, toppath, session, index=None, map=map):
+        super().__init__(toppath, session)
+        self.index = index
+        self.map = map
+        self._lock = threading.Lock()
+
+    def tasks(self):
+        if self.is_archive:
+            archive_task = self.unarchive()
+            if not archive_task:
+                return
+        singletons = self.session.config['singletons']
+
+        def read(entry):
+            dirs, paths = entry
+            if singletons:
+                return dirs, [self.singleton(path) for path in paths]
+            return dirs, [self.album(paths, dirs)]
+
+        for dirs, tasks in self.map(read, self.paths()):
+            for task in tasks:
+                yield from self._create(task)
+            if singletons:
+                yield self.sentinel(dirs)
+
+        if self.is_archive:
+            yield archive_task
+        else:
+            yield self.sentinel()
+
+    def _read(self, paths, dirs):
+        """Return the items of `paths`, or None if `dirs` are unchanged
+        and finished or already imported.
+        """
+        if self.index is not None:
+            stats = file_stats(paths)
+            key, sig = dir_key(dirs), signature(stats)
+            if self.index.unchanged(key, sig):
+                return self._skip(dirs)
+        if self.session.already_imported(self.toppath, dirs):
+            return self._skip(dirs)
+        with metrics().timer(OPERATION_SECONDS, operation='read_tags'):
+            if self.index is None:
+                items = [self.read_item(path) for path in paths]
+            else:
+                items = self.index.items(stats, self.read_item)
+        if self.index is not None:
+            self.index.seen(key, sig)
+        return [item for item in items if item]
+
+    def _skip(self, dirs):
+        log.debug(u'Skipping unchanged path: {0}', displayable_path(dirs))
+        with self._lock:
+            self.skipped += 1
+        return None
+
+    def singleton(self, path):
+        items = self._read([path], [path])
+        if items:
+            return SingletonImportTask(self.toppath, items[0])
+        return None
+
+    def album(self, paths, dirs=None):
+        if not paths:
+            return None
+        if dirs is None:
+            dirs = list({os.path.dirname(p) for p in paths})
+        items = self._read(paths, dirs)
+        if items:
+            return ImportTask(self.toppath, dirs, items)
+        return None
+
+
+def scan_tasks(session, index=None, map=map):
+    """Like beets' `read_tasks`, but with an `IndexedTaskFactory`. Tasks
+    are yielded as the walk finds their directories.
+    """
+    skipped = 0
+    for toppath in session.paths:
+        session.ask_resume(toppath)
+        task_factory = IndexedTaskFactory(toppath, session, index, map)
+        yield from task_factory.tasks()
+        skipped += task_factory.skipped
+    if skipped:
+        log.info(u'Skipped {0} unchanged paths.', skipped)
+
+
+_indexes = dict()
+_indexes_lock = threading.Lock()
+
+
+def scan_index():
+    """Return the configured `ScanIndex`, or None if it is disabled."""
+    if not config['webimport']['scan_index'].get(bool):
+        return None
+    path = cache_path()
+    with _indexes_lock:
+        if path not in _indexes:
+            _indexes[path] = ScanIndex(path)
+        return _indexes[path]
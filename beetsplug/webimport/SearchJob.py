@@ -0,0 +1,164 @@
+"""Runs the searches of users in the background, so that a request which
+starts a search returns right away with a job that can be polled or
+cancelled and that gives up after a timeout.
+"""
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from beets import config, logging
+
+from beetsplug.webimport.EventLog import SEARCH
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+TIMEOUT = 'timeout'
+
+log = logging.getLogger('beets')
+
+
+class SearchJob(object):
+    """A search for new candidates of the task `task_id` of `session`,
+    by the ids in `search_ids` or by `artist` and `name`.
+
+    The candidates found replace those of the task only if the job is
+    still running when the lookup returns; a cancelled or timed out job
+    leaves the task as it is. A lookup that already reached the metadata
+    source cannot be interrupted, its result is dropped.
+    """
+
+    def __init__(self, job_id, session, task_id, search_ids=(), artist=None,
+                 name=None, timeout=None):
+        self.id = job_id
+        self.session = session
+        self.task_id = task_id
+        self.search_ids = search_ids
+        self.artist = artist
+        self.name = name
+        self.timeout = timeout
+        self.state = QUEUED
+        self.error = None
+        self.candidates = None
+        self.created = time.time()
+        self.finished = None
+        self.future = None
+        self._timer = None
+        self._lock = threading.Lock()
+
+    @property
+    def over(self):
+        return self.state not in (QUEUED, RUNNING)
+
+    def start(self, executor):
+        if self.timeout:
+            self._timer = threading.Timer(self.timeout, self._finish,
+                                          (TIMEOUT,))
+            self._timer.daemon = True
+            self._timer.start()
+        self.future = executor.submit(self.run)
+
+    def run(self):
+        with self._lock:
+            if self.state != QUEUED:
+                return
+            self.state = RUNNING
+        task = self.session.tasks.get(self.task_id)
+        if task is None:
+            self._finish(FAILED, u'task {0} is not pending'
+                         .format(self.task_id))
+            return
+        try:
+            prop = self.session.search(task, self.search_ids, self.artist,
+                                       self.name)
+        except Exception as exc:
+            log.error(u'search {0} failed: {1}', self.id, exc)
+            self._finish(FAILED, str(exc))
+            return
+        self._finish(DONE, task=task, prop=prop)
+
+    def cancel(self):
+        """Cancel the job. Returns False if it was already over."""
+        if self.future is not None:
+            self.future.cancel()
+        return self._finish(CANCELLED)
+
+    def _finish(self, state, error=None, task=None, prop=None):
+        with self._lock:
+            if self.over:
+                return False
+            if prop is not None:
+                self.candidates = len(prop.candidates)
+                self.session.set_candidates(self.task_id, task, prop)
+            self.state = state
+            self.error = error
+            self.finished = time.time()
+        if self._timer is not None:
+            self._timer.cancel()
+        self.session.events.emit(SEARCH, self.id)
+        return True
+
+    def as_dict(self):
+        end = self.finished or time.time()
+        return {
+            'id': self.id,
+            'session': self.session.id,
+            'task_id': self.task_id,
+            'state': self.state,
+            'candidates': self.candidates,
+            'elapsed': round(end - self.created, 3),
+            'error': self.error,
+        }
+
+
+class SearchRunner(object):
+    """Executes search jobs on `search_workers` background threads and
+    keeps the last `maxlen` jobs for polling.
+    """
+
+    def __init__(self, maxlen=1000):
+        self.maxlen = maxlen
+        self._jobs = OrderedDict()
+        self._ids = itertools.count(1)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def submit(self, session, task_id, search_ids=(), artist=None,
+               name=None, timeout=None):
+        if timeout is None:
+            timeout = config['webimport']['search_timeout'].as_number()
+        with self._lock:
+            if self._executor is None:
+                workers = config['webimport']['search_workers'].get(int)
+                self._executor = ThreadPoolExecutor(
+                    max(workers, 1), thread_name_prefix='webimport-search')
+            job = SearchJob(str(next(self._ids)), session, task_id,
+                            search_ids, artist, name, timeout)
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.maxlen:
+                self._jobs.popitem(last=False)
+        job.start(self._executor)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self, session):
+        with self._lock:
+            return [job for job in self._jobs.values()
+                    if job.session is session]
+
+    def drop(self, session):
+        """Cancel and forget the jobs of `session`."""
+        with self._lock:
+            dropped = [job for job in self._jobs.values()
+                       if job.session is session]
+            for job in dropped:
+                del self._jobs[job.id]
+        for job in dropped:
+            job.cancel()
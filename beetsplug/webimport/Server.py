@@ -0,0 +1,103 @@
+"""Serves the web application with Werkzeug's development server or, with
+`server: waitress`, with the waitress WSGI server, and shuts down only
+after the running imports finished moving or copying their files. Every
+open event stream holds a server thread, so their number is bounded.
+"""
+import signal
+import threading
+import time
+
+from beets import config, logging
+
+log = logging.getLogger('beets')
+
+
+def max_event_streams():
+    """The number of event streams that may be open at once. With
+    waitress, at least one of its threads is left for the other requests.
+    """
+    limit = config['webimport']['max_event_streams'].get(int)
+    if config['webimport']['server'].as_str() == 'waitress':
+        limit = min(limit, config['webimport']['server_threads'].get(int) - 1)
+    return max(limit, 0)
+
+
+_stream_slots = dict()
+_stream_slots_lock = threading.Lock()
+
+
+def stream_slots():
+    """Return the semaphore that bounds the open event streams."""
+    limit = max_event_streams()
+    with _stream_slots_lock:
+        if limit not in _stream_slots:
+            _stream_slots[limit] = threading.BoundedSemaphore(limit) \
+                if limit else threading.Semaphore(0)
+        return _stream_slots[limit]
+
+
+def open_stream():
+    """Take a slot for an event stream and return the function that
+    gives it back, or None if all `max_event_streams` are taken.
+    """
+    slots = stream_slots()
+    if not slots.acquire(blocking=False):
+        log.warning(u'webimport: all {0} event streams are taken',
+                    max_event_streams())
+        return None
+    return slots.release
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt()
+
+
+def serve_waitress(app, host, port):
+    from waitress import create_server
+    threads = config['webimport']['server_threads'].get(int)
+    if config['webimport']['max_event_streams'].get(int) >= threads:
+        log.warning(u'webimport: max_event_streams must be below '
+                    u'server_threads, allowing {0} event streams',
+                    max_event_streams())
+    server = create_server(
+        app, host=host, port=port,
+        threads=threads,
+        backlog=config['webimport']['server_backlog'].get(int),
+        channel_timeout=config['webimport']['server_keep_alive'].get(int),
+        # Read ahead, so that a client closing an event stream is noticed.
+        channel_request_lookahead=1,
+        ident='beets-webimport')
+    if threading.current_thread() is threading.main_thread():
+        # Stop like on ^C, instead of dying with the imports half done.
+        signal.signal(signal.SIGTERM, _interrupt)
+    log.info(u'webimport: serving on http://{0}:{1}', host, port)
+    try:
+        # Returns once it is interrupted, after the request threads
+        # finished.
+        server.run()
+    finally:
+        server.close()
+
+
+def serve(app, host, port, debug=False):
+    """Run `app` until the server is interrupted."""
+    name = config['webimport']['server'].as_choice(['werkzeug', 'waitress'])
+    if name == 'waitress' and not debug:
+        serve_waitress(app, host, port)
+    else:
+        app.run(host=host, port=port, debug=debug, threaded=True)
+
+
+def drain(sessions, timeout):
+    """Wait up to `timeout` seconds in all for the imports of `sessions`
+    to finish and close the sessions.
+    """
+    deadline = time.monotonic() + timeout
+    for session in sessions:
+        if session.importing > 0:
+            log.info(u'webimport: waiting for {0} tasks of session {1}',
+                     session.importing, session.id)
+        if not session.wait(max(0, deadline - time.monotonic())):
+            log.warning(u'webimport: session {0} still has {1} tasks '
+                        u'importing', session.id, session.importing)
+        session.close()
@@ -0,0 +1,136 @@
+"""Keeps the import sessions that run side by side, keyed by their id,
+and drops the idle ones to bound time and memory spent on them.
+"""
+import threading
+import time
+
+from beets import config, logging
+
+from beetsplug.webimport.ImportJob import FAILED
+from beetsplug.webimport.SessionSnapshot import session_snapshot
+from beetsplug.webimport.WebImporter import WebImporter, DONE
+
+log = logging.getLogger('beets')
+
+
+class SessionEntry(object):
+    """A registered session with the lock that serializes the requests
+    changing it.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.lock = threading.RLock()
+        self.accessed = time.time()
+
+    @property
+    def busy(self):
+        """Whether the session is still scanning or importing."""
+        job = self.session.job
+        if job is not None and job.state not in (DONE, FAILED):
+            return True
+        return self.session.importing > 0
+
+
+class SessionRegistry(object):
+    """Maps session ids to `SessionEntry` objects. The session that was
+    added last is the current one, which the routes without a session id
+    in their URL work on.
+
+    Sessions that were not accessed for `session_timeout` seconds are
+    evicted, as are the least recently accessed ones beyond
+    `max_sessions`. Busy sessions are never evicted. An evicted session
+    stays in the snapshot and is restored when it is accessed again. The
+    jobs of `runners` that refer to a removed or evicted session are
+    dropped with it, so that it can be freed.
+    """
+
+    def __init__(self, runners=()):
+        self.runners = list(runners)
+        self.current = None
+        self._entries = dict()
+        self._lock = threading.Lock()
+
+    def add(self, session):
+        entry = SessionEntry(session)
+        with self._lock:
+            replaced = self._entries.get(session.id)
+            self._entries[session.id] = entry
+            self.current = session.id
+        if replaced is not None and replaced.session is not session:
+            self._drop_jobs(replaced.session)
+        self.evict()
+        return entry
+
+    def _drop_jobs(self, session):
+        for runner in self.runners:
+            runner.drop(session)
+
+    def get(self, session_id=None, lib=None):
+        """Return the entry of `session_id`, or of the current session if
+        it is None. Sessions that are not registered are restored from
+        the snapshot if `lib` is given. Returns None for unknown ids.
+        """
+        with self._lock:
+            if session_id is None:
+                session_id = self.current
+            if session_id is None:
+                return None
+            entry = self._entries.get(session_id)
+            if entry is None and lib is not None:
+                session = WebImporter.resumed(lib, session_id)
+                if session is not None:
+                    entry = self._entries[session_id] = SessionEntry(session)
+            if entry is not None:
+                entry.accessed = time.time()
+        return entry
+
+    def remove(self, session_id):
+        """Close the session `session_id` and drop it from the registry
+        and the snapshot. Returns False if the id is unknown.
+        """
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+            if self.current == session_id:
+                self.current = None
+        if entry is not None:
+            entry.session.close()
+            self._drop_jobs(entry.session)
+        snapshot = session_snapshot()
+        if snapshot is not None:
+            known = session_id in snapshot.sessions()
+            snapshot.forget(session_id)
+            return entry is not None or known
+        return entry is not None
+
+    def entries(self):
+        """The registered entries, the most recently accessed first."""
+        with self._lock:
+            return sorted(self._entries.values(),
+                          key=lambda e: e.accessed, reverse=True)
+
+    def sessions(self):
+        """The registered sessions, the most recently accessed first."""
+        return [entry.session for entry in self.entries()]
+
+    def evict(self):
+        """Drop the sessions that are idle beyond the configured budget.
+        """
+        timeout = config['webimport']['session_timeout'].get(int)
+        max_sessions = config['webimport']['max_sessions'].get(int)
+        now = time.time()
+        evicted = []
+        with self._lock:
+            entries = sorted(self._entries.values(),
+                             key=lambda e: e.accessed, reverse=True)
+            for i, entry in enumerate(entries):
+                if entry.busy:
+                    continue
+                if i >= max_sessions or now - entry.accessed > timeout:
+                    del self._entries[entry.session.id]
+                    evicted.append(entry.session)
+        for session in evicted:
+            log.debug(u'evicting idle import session {0}', session.id)
+            session.close()
+            self._drop_jobs(session)
+        return evicted
@@ -0,0 +1,212 @@
+"""Keeps the pending tasks of the import sessions on disk, so that a
+restarted server can pick the sessions up without reading tags or
+querying metadata sources again.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from beets import config, util
+from beets.importer import ImportTask, SingletonImportTask
+from beets.library import Item
+
+from beetsplug.webimport.LookupCache import cache_path, pack_candidates, \
+    unpack_candidates
+
+
+def _mtimes(paths):
+    """Map `paths` to their modification times, None if one is gone."""
+    try:
+        return dict((path, os.path.getmtime(util.syspath(path)))
+                    for path in paths)
+    except OSError:
+        return None
+
+
+def _task_files(paths, items):
+    """The directories of a task and the files of its items."""
+    return list(paths) + [item.path for item in items]
+
+
+def dump_task(task):
+    """Return the state of the pending `task` as a picklable dict."""
+    items = task.items
+    match = None
+    for i, candidate in enumerate(task.candidates):
+        if candidate is getattr(task, 'match', None):
+            match = i
+    duplicates = None
+    if getattr(task, 'found_duplicates', None) is not None:
+        duplicates = [(isinstance(obj, Item), obj.id)
+                      for obj in task.found_duplicates]
+    return {
+        'singleton': isinstance(task, SingletonImportTask),
+        'toppath': task.toppath,
+        'paths': task.paths,
+        'mtimes': _mtimes(_task_files(task.paths, items)),
+        'items': [dict(item) for item in items],
+        'cur_artist': getattr(task, 'cur_artist', None),
+        'cur_album': getattr(task, 'cur_album', None),
+        'candidates': pack_candidates(items, task.candidates),
+        'rec': task.rec,
+        'choice_flag': task.choice_flag,
+        'match': match,
+        'found_duplicates': duplicates,
+    }
+
+
+def load_task(lib, state):
+    """Rebuild a task from `dump_task` output. Returns None if one of its
+    directories or files changed since the task was stored.
+    """
+    items = [Item(lib if values.get('id') else None, **values)
+             for values in state['items']]
+    if state['mtimes'] is None or \
+            _mtimes(_task_files(state['paths'], items)) != state['mtimes']:
+        return None
+    if state['singleton']:
+        task = SingletonImportTask(state['toppath'], items[0])
+    else:
+        task = ImportTask(state['toppath'], state['paths'], items)
+        task.cur_artist = state['cur_artist']
+        task.cur_album = state['cur_album']
+    task.candidates = unpack_candidates(items, state['candidates'])
+    task.rec = state['rec']
+    task.choice_flag = state['choice_flag']
+    task.match = None
+    if state['match'] is not None:
+        task.match = task.candidates[state['match']]
+    if state['found_duplicates'] is not None:
+        task.found_duplicates = [
+            lib.get_item(obj_id) if is_item else lib.get_album(obj_id)
+            for is_item, obj_id in state['found_duplicates']]
+    return task
+
+
+class SessionSnapshot(object):
+    """Stores the paths of each session and their pending tasks in an
+    SQLite database at `path`. Tasks are written one at a time as they
+    change.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute('CREATE TABLE IF NOT EXISTS snapshot_sessions ('
+                             'session TEXT PRIMARY KEY, created REAL)')
+            self._db.execute('CREATE TABLE IF NOT EXISTS session_tasks ('
+                             'session TEXT, task_id TEXT, value BLOB, '
+                             'PRIMARY KEY (session, task_id))')
+            self._db.execute('CREATE TABLE IF NOT EXISTS session_paths ('
+                             'session TEXT, path BLOB)')
+
+    def sessions(self):
+        """The ids of the stored sessions, the most recent one first."""
+        with self._lock:
+            rows = self._db.execute('SELECT session FROM snapshot_sessions '
+                                    'ORDER BY created DESC')
+            return [row[0] for row in rows]
+
+    def paths(self, session_id):
+        with self._lock:
+            rows = self._db.execute('SELECT path FROM session_paths '
+                                    'WHERE session = ?', (session_id,))
+            return [row[0] for row in rows]
+
+    def find(self, paths):
+        """The id of the most recent stored session for exactly `paths`,
+        None if there is none.
+        """
+        for session_id in self.sessions():
+            if sorted(self.paths(session_id)) == sorted(paths):
+                return session_id
+        return None
+
+    def prune(self):
+        """Forget the sessions without stored tasks or whose paths are
+        all gone. Returns their ids.
+        """
+        with self._lock:
+            empty = [row[0] for row in self._db.execute(
+                'SELECT session FROM snapshot_sessions WHERE session NOT IN '
+                '(SELECT DISTINCT session FROM session_tasks)')]
+        for session_id in self.sessions():
+            if session_id not in empty and not any(
+                    os.path.exists(util.syspath(path))
+                    for path in self.paths(session_id)):
+                empty.append(session_id)
+        for session_id in empty:
+            self.forget(session_id)
+        return empty
+
+    def save(self, session_id, task_id, task):
+        value = pickle.dumps(dump_task(task))
+        with self._lock, self._db:
+            self._db.execute('INSERT OR REPLACE INTO session_tasks '
+                             'VALUES (?, ?, ?)', (session_id, task_id, value))
+
+    def delete(self, session_id, task_id):
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM session_tasks '
+                             'WHERE session = ? AND task_id = ?',
+                             (session_id, task_id))
+
+    def forget(self, session_id):
+        """Drop the session `session_id` and all of its tasks."""
+        with self._lock, self._db:
+            for table in ('snapshot_sessions', 'session_tasks',
+                          'session_paths'):
+                self._db.execute('DELETE FROM {0} WHERE session = ?'
+                                 .format(table), (session_id,))
+
+    def restore(self, lib, session_id, paths):
+        """Make `paths` the paths of the session `session_id` and return
+        its stored tasks below them that are still valid, keyed by task
+        id. All other tasks of the session are dropped from the snapshot.
+        """
+        with self._lock:
+            rows = self._db.execute('SELECT task_id, value '
+                                    'FROM session_tasks WHERE session = ?',
+                                    (session_id,)).fetchall()
+        tasks = dict()
+        for task_id, value in rows:
+            try:
+                state = pickle.loads(value)
+            except Exception:
+                continue
+            if state['toppath'] in paths:
+                task = load_task(lib, state)
+                if task is not None:
+                    tasks[task_id] = task
+        with self._lock, self._db:
+            self._db.execute('INSERT OR IGNORE INTO snapshot_sessions '
+                             'VALUES (?, ?)', (session_id, time.time()))
+            self._db.execute('DELETE FROM session_paths WHERE session = ?',
+                             (session_id,))
+            self._db.executemany('INSERT INTO session_paths VALUES (?, ?)',
+                                 [(session_id, path) for path in paths])
+            for task_id, _ in rows:
+                if task_id not in tasks:
+                    self._db.execute('DELETE FROM session_tasks '
+                                     'WHERE session = ? AND task_id = ?',
+                                     (session_id, task_id))
+        return tasks
+
+
+_snapshots = dict()
+_snapshots_lock = threading.Lock()
+
+
+def session_snapshot():
+    """Return the configured `SessionSnapshot`, or None if disabled."""
+    if not config['webimport']['resume'].get(bool):
+        return None
+    path = cache_path()
+    with _snapshots_lock:
+        if path not in _snapshots:
+            _snapshots[path] = SessionSnapshot(path)
+        return _snapshots[path]
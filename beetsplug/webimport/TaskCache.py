@@ -0,0 +1,40 @@
+"""Cache of the encoded JSON of pending tasks, so that serving a task
+which did not change since the last request costs a dict lookup.
+"""
+
+
+class TaskCache(object):
+    """Maps task ids to `(version, json)` pairs. An entry is only used
+    while the task still has the version it was encoded at; the session
+    bumps the version and drops the entry whenever it changes a task.
+    """
+
+    def __init__(self):
+        self._entries = dict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, task_id, version, encode):
+        """Return the cached JSON of `task_id` at `version`, calling
+        `encode` to produce and store it on a miss. `version` has to be
+        read before the task is encoded, so that a change made while
+        encoding leaves an entry which is already outdated.
+        """
+        entry = self._entries.get(task_id)
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        data = encode()
+        self._entries[task_id] = (version, data)
+        return data
+
+    def drop(self, task_id):
+        self._entries.pop(task_id, None)
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self._entries),
+        }
@@ -0,0 +1,86 @@
+"""The pending tasks of a session, shared between the pipeline threads
+that add them and the request threads that read and decide on them.
+"""
+import threading
+from types import MappingProxyType
+
+
+class TaskStore(object):
+    """Maps task ids to pending tasks.
+
+    Ids are allocated under a lock, so they are unique across threads.
+    Reads do not lock: `get` is a single dict lookup, and `snapshot`
+    returns a read-only copy that is only made again after the store
+    changed. Every task has a lock of its own, which code changing the
+    task holds while it checks the task is still pending and changes it.
+    """
+
+    def __init__(self):
+        self.last_id = 0
+        self._tasks = dict()
+        self._locks = dict()
+        self._snapshot = MappingProxyType(dict())
+        self._lock = threading.Lock()
+
+    def add(self, task):
+        """Store `task` under a new id and return the id."""
+        with self._lock:
+            self.last_id += 1
+            task_id = str(self.last_id)
+            self._store(task_id, task)
+        return task_id
+
+    def put(self, task_id, task):
+        """Store `task` under the given id, as when restoring a session.
+        """
+        with self._lock:
+            self.last_id = max(self.last_id, int(task_id))
+            self._store(task_id, task)
+
+    def _store(self, task_id, task):
+        self._locks.setdefault(task_id, threading.RLock())
+        self._tasks[task_id] = task
+        self._snapshot = None
+
+    def pop(self, task_id, default=None):
+        with self._lock:
+            if task_id not in self._tasks:
+                return default
+            self._locks.pop(task_id, None)
+            self._snapshot = None
+            return self._tasks.pop(task_id)
+
+    def get(self, task_id, default=None):
+        return self._tasks.get(task_id, default)
+
+    def lock(self, task_id):
+        """Return the lock of the task `task_id`. Unknown ids get a lock
+        of their own, as there is nothing to protect for them.
+        """
+        lock = self._locks.get(task_id)
+        if lock is None:
+            return threading.RLock()
+        return lock
+
+    def snapshot(self):
+        """Return a read-only mapping of the pending tasks at this point.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = MappingProxyType(dict(self._tasks))
+                snapshot = self._snapshot
+        return snapshot
+
+    def __getitem__(self, task_id):
+        return self._tasks[task_id]
+
+    def __contains__(self, task_id):
+        return task_id in self._tasks
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def items(self):
+        return self.snapshot().items()
@@ -1,186 +1,879 @@
-from doctest import SKIP
-
-from beets.autotag import Recommendation
-
-from beets import importer, config, plugins, autotag
-from beets.importer import apply_choice, plugin_stage, manipulate_files, \
-    QUEUE_SIZE, ImportAbort, read_tasks, \
-    lookup_candidates, SentinelImportTask, SingletonImportTask, action, \
-    group_albums, _extend_pipeline, resolve_duplicates, _freshen_items, ImportTask
-from beets.ui.commands import _summary_judgment, manual_id
-from beets.util import pipeline
-
-
-@pipeline.stage
-def save_or_set_apply_matches(session, task):
-    if _summary_judgment(task.rec) == importer.action.APPLY:
-        resolve_duplicates(session, task)
-        task.set_choice(task.candidates[0])
-        apply_choice(session, task)
-        return task
-
-    # extend pipeline with apply
-    if type(task) == SentinelImportTask:
-        return task
-    task.set_choice(action.SKIP)
-    session.add_task(task)
-    return task
-
-
-class WebImporter(importer.ImportSession):
-
-    def __init__(self, lib, loghandler, paths, query):
-        super().__init__(lib, loghandler, paths, query)
-        self.tasks = dict()
-        self.last_task_id = 0
-
-    def next_id(self):
-        self.last_task_id += 1
-        return str(self.last_task_id)
-
-    def add_task(self, task):
-        self.tasks[self.next_id()] = task
-
-    def should_resume(self, path):
-        return False
-
-    def choose_match(self, task):
-        raise NotImplementedError
-
-    def resolve_duplicate(self, task, found_duplicates):
-        if config['import']['quiet']:
-            task.set_choice(SKIP)
-        else:
-            task.found_duplicates = found_duplicates
-
-    def choose_item(self, task):
-        raise NotImplementedError
-
-    def choose_candidate(self, task_id, candidate_index):
-        task = self.tasks.get(task_id)
-        if not task:
-            print(task, "not in tasks")
-            return
-        task = self.tasks[task_id]
-        task.match = task.candidates[candidate_index]
-
-    def merge_duplicates(self, task_id):
-        task = self.tasks.pop(task_id, None)
-        if not task:
-            print(task, "not in tasks")
-            return
-        task = self.tasks[task_id]
-        # def emitter():
-        duplicate_items = task.duplicate_items(self.lib)
-        _freshen_items(duplicate_items)
-        duplicate_paths = [item.path for item in duplicate_items]
-
-        # Record merged paths in the session so they are not reimported
-        self.mark_merged(duplicate_paths)
-
-        merged_task = ImportTask(None, task.paths + duplicate_paths,
-                                 task.items + duplicate_items)
-
-        self.new_pipeline([merged_task], self.lookup_stages())
-
-    def search_id(self, task_id, search_id):
-        task = self.tasks.get(task_id)
-        if not task:
-            print(task, "not in tasks")
-            return
-        if task.is_album:
-            _, _, prop = autotag.tag_album(
-                task.items, search_ids=search_id.split()
-            )
-        else:
-            prop = autotag.tag_item(task.item, search_ids=search_id.split())
-        if len(prop.candidates) > 0:
-            task.candidates = prop.candidates
-            task.rec = prop.recommendation
-        return task
-
-    def search_name(self, task_id, name, artist):
-        task = self.tasks.get(task_id)
-        if not task:
-            print(task, "not in tasks")
-            return
-        if task.is_album:
-            _, _, prop = autotag.tag_album(
-                task.items, artist, name
-            )
-        else:
-            prop = autotag.tag_item(task.item, artist, name)
-        if len(prop.candidates) > 0:
-            task.candidates = prop.candidates
-            task.rec = prop.recommendation
-        return task
-
-    def as_tracks(self, task_id):
-        def emitter(task):
-            for item in task.items:
-                task = SingletonImportTask(task.toppath, item)
-                for new_task in task.handle_created(self):
-                    yield new_task
-            yield SentinelImportTask(task.toppath, task.paths)
-
-        task = self.tasks.pop(task_id, None)
-        if not task:
-            print(task, "not in tasks")
-            return
-
-        self.new_pipeline(emitter(task), self.lookup_stages())
-
-    def import_task(self, task_id):
-        task = self.tasks.pop(task_id, None)
-        if not task:
-            print(task, "not in tasks")
-            return
-
-        self.set_config(config['import'])
-        apply_choice(self, task)
-
-        self.new_pipeline([task], self.generate_stages())
-        return True
-
-    def run(self):
-        self.set_config(config['import'])
-        self.new_pipeline(read_tasks(self), self.lookup_stages())
-        plugins.send('import', lib=self.lib, paths=self.paths)
-
-    def resolved_duplicates(self, task_id):
-        task = self.tasks.get(task_id)
-        if not task:
-            print(task, "not in tasks")
-            return
-        self.set_config(config['import'])
-        task = self.tasks[task_id]
-        resolve_duplicates(self, task)
-        return not hasattr(task, 'found_duplicates')
-
-    def new_pipeline(self, tasks, stages):
-
-        if type(tasks) == list:
-            task_iter = iter(tasks)
-        else:
-            task_iter = tasks
-
-        pl = pipeline.Pipeline([task_iter] + stages)
-        plugins.send('import_begin', session=self)
-        if config['threaded']:
-            pl.run_parallel(QUEUE_SIZE)
-        else:
-            pl.run_sequential()
-
-    def lookup_stages(self):
-        return [lookup_candidates(self),
-                save_or_set_apply_matches(self)] + self.generate_stages()
-
-    def generate_stages(self):
-        stages = []
-        for stage_func in plugins.early_import_stages():
-            stages.append(plugin_stage(self, stage_func))
-        for stage_func in plugins.import_stages():
-            stages.append(plugin_stage(self, stage_func))
-
-        stages.append(manipulate_files(self))
-        return stages
+import collections
+import functools
+import queue
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from beets.autotag import Recommendation, Proposal
+
+from beets import importer, config, plugins, autotag, logging
+from beets.importer import apply_choice, plugin_stage, manipulate_files, \
+    QUEUE_SIZE, ImportAbort, \
+    SentinelImportTask, SingletonImportTask, action, \
+    group_albums, _extend_pipeline, _freshen_items, ImportTask
+from beets.ui.commands import _summary_judgment, manual_id
+from beets.util import pipeline
+
+from beetsplug.webimport.ApplyPolicy import apply_policy
+from beetsplug.webimport.CandidateList import CandidateList
+from beetsplug.webimport.DuplicateIndex import DuplicateIndex
+from beetsplug.webimport.EventLog import EventLog, ADDED, CANDIDATES, \
+    CHANGED, IMPORTED, SKIPPED
+from beetsplug.webimport.LookupBroker import lookup_broker
+from beetsplug.webimport.LookupCache import lookup_cache, \
+    pack_candidates, unpack_candidates
+from beetsplug.webimport.MemoryUsage import deep_size
+from beetsplug.webimport.Metrics import AUTO_DECIDED, OPERATION_SECONDS, \
+    metrics, timed_pipeline
+from beetsplug.webimport.ScanIndex import scan_index, scan_tasks
+from beetsplug.webimport.SessionSnapshot import session_snapshot
+from beetsplug.webimport.TaskCache import TaskCache
+from beetsplug.webimport.TaskStore import TaskStore
+
+log = logging.getLogger('beets')
+
+# Session states, in the order a session goes through them.
+QUEUED = 'queued'
+SCANNING = 'scanning'
+LOOKING_UP = 'looking-up'
+DONE = 'done'
+
+# Number of finished tasks whose progress is still reported.
+PROGRESS_KEPT = 1000
+
+
+def ordered_map(func, iterable, workers):
+    """Apply `func` to the elements of `iterable` on a pool of `workers`
+    threads and yield the results in input order. At most twice as many
+    elements as there are workers are in flight at a time.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = collections.deque()
+        for element in iterable:
+            pending.append(pool.submit(func, element))
+            while pending and (pending[0].done() or
+                               len(pending) >= 2 * workers):
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def lookup_task(session, task):
+    """Look up the candidates of `task` like beets' `lookup_candidates`
+    stage does, but return the task so it can run outside a pipeline.
+    """
+    if task.skip:
+        return task
+    plugins.send('import_task_start', session=session, task=task)
+    task.search_ids = session.config['search_ids'].as_str_seq()
+    with metrics().timer(OPERATION_SECONDS, operation='lookup_candidates'):
+        session.lookup_candidates(task)
+    return task
+
+
+def resolve_duplicates(session, task):
+    """Like beets' `resolve_duplicates`, but find the duplicates with
+    the session's duplicate index.
+    """
+    if task.choice_flag in (action.ASIS, action.APPLY, action.RETAG):
+        with metrics().timer(OPERATION_SECONDS,
+                             operation='resolve_duplicates'):
+            found_duplicates = session.find_duplicates(task)
+        if found_duplicates:
+            log.debug(u'found duplicates: {0}',
+                      [o.id for o in found_duplicates])
+            duplicate_action = config['import']['duplicate_action'] \
+                .as_choice({
+                    'skip': 's',
+                    'keep': 'k',
+                    'remove': 'r',
+                    'merge': 'm',
+                    'ask': 'a',
+                })
+            if duplicate_action == 's':
+                task.set_choice(action.SKIP)
+            elif duplicate_action == 'k':
+                pass
+            elif duplicate_action == 'r':
+                task.should_remove_duplicates = True
+            elif duplicate_action == 'm':
+                task.should_merge_duplicates = True
+            else:
+                session.resolve_duplicate(task, found_duplicates)
+            session.log_choice(task, True)
+
+
+@pipeline.stage
+def save_or_set_apply_matches(session, task):
+    task = session.settle(task)
+    if task is None:
+        return pipeline.BUBBLE
+    return task
+
+
+_io_slots = None
+_io_slots_lock = threading.Lock()
+
+
+def io_slots():
+    """Return the semaphore that bounds how many tasks have their files
+    moved or copied at the same time, across all pipelines.
+    """
+    global _io_slots
+    with _io_slots_lock:
+        if _io_slots is None:
+            _io_slots = threading.BoundedSemaphore(
+                config['webimport']['io_concurrency'].get(int))
+        return _io_slots
+
+
+@pipeline.stage
+def file_stage(session, stage, task):
+    """Pass `task` to the primed file manipulation stage coroutine
+    `stage` while holding an I/O slot, and tell `session` once it went
+    through. Tasks that are imported or skipped without an error are
+    marked finished in the scan index.
+    """
+    with io_slots():
+        session.task_started(task)
+        try:
+            stage.send(task)
+            session.mark_finished(task)
+        finally:
+            session.task_done(task)
+
+
+class WebImporter(importer.ImportSession):
+
+    def __init__(self, lib, loghandler, paths, query, session_id=None):
+        super().__init__(lib, loghandler, paths, query)
+        self.id = session_id or uuid.uuid4().hex
+        self.job = None
+        self.tasks = TaskStore()
+        self.state = QUEUED
+        self.scanned = 0
+        self.looked_up = 0
+        self.events = EventLog()
+        self.versions = dict()
+        self.json_cache = TaskCache()
+        self.lookup_cache = lookup_cache()
+        self.broker = lookup_broker()
+        self.snapshot = session_snapshot()
+        self.scan_index = scan_index()
+        self.duplicates = DuplicateIndex(lib)
+        self.policy = apply_policy()
+        self.restored_dirs = set()
+        self.decisions = queue.Queue()
+        self.importing = 0
+        self.progress = dict()
+        self._progress_done = collections.deque()
+        self._in_flight = set()
+        self._progress_ids = dict()
+        self._item_tasks = dict()
+        self._decisions_cond = threading.Condition()
+        self._decisions_thread = None
+
+    @classmethod
+    def resumed(cls, lib, session_id):
+        """Return the session `session_id` stored in the snapshot with
+        its pending tasks, or None if there is none.
+        """
+        snapshot = session_snapshot()
+        paths = snapshot.paths(session_id) if snapshot else None
+        if not paths:
+            return None
+        session = cls(lib, None, paths, None, session_id)
+        session.resume()
+        session.state = DONE
+        return session
+
+    def resume(self):
+        """Take over the tasks from the snapshot that belong to this
+        session's paths and whose files did not change. Their directories
+        are not read again.
+        """
+        if self.snapshot is None:
+            return
+        for task_id, task in self.snapshot.restore(self.lib, self.id,
+                                                   self.paths).items():
+            match = next((i for i, c in enumerate(task.candidates)
+                          if c is task.match), None)
+            task.candidates = self.keep_candidates(task, task.candidates)
+            if match is not None:
+                task.match = task.candidates[match]
+            self.tasks.put(task_id, task)
+            self.versions[task_id] = 1
+            self.restored_dirs.add(tuple(task.paths))
+
+    def already_imported(self, toppath, paths):
+        if tuple(paths) in self.restored_dirs:
+            return True
+        return super().already_imported(toppath, paths)
+
+    def changed(self, kind, task_id, task=None):
+        """Record a change of the task `task_id`: bump its version, drop
+        its cached JSON and tell the event listeners. `task` is the task
+        that was imported or skipped, the pending task otherwise.
+        """
+        with self.tasks.lock(task_id):
+            if kind in (IMPORTED, SKIPPED):
+                self.versions.pop(task_id, None)
+                if self.snapshot:
+                    self.snapshot.delete(self.id, task_id)
+            else:
+                task = self.tasks.get(task_id)
+                if task is None:
+                    # Taken by another thread, which reports that.
+                    return
+                self.versions[task_id] = self.versions.get(task_id, 0) + 1
+                if self.snapshot:
+                    self.snapshot.save(self.id, task_id, task)
+            self.json_cache.drop(task_id)
+            self.events.emit(kind, task_id)
+
+    def add_task(self, task):
+        self.changed(ADDED, self.tasks.add(task))
+
+    def take_task(self, task_id, kind):
+        """Remove the pending task `task_id` and record it as `kind`.
+        Returns None if it is no longer pending.
+        """
+        with self.tasks.lock(task_id):
+            task = self.tasks.pop(task_id)
+            if task:
+                self.changed(kind, task_id, task)
+        return task
+
+    def skip_task(self, task_id):
+        task = self.take_task(task_id, SKIPPED)
+        if task:
+            self.mark_finished(task)
+        return task
+
+    def mark_finished(self, task):
+        """Leave the directories of `task`, which was imported or skipped,
+        out of later scans until their files change.
+        """
+        if self.scan_index and type(task) != SentinelImportTask:
+            self.scan_index.finished(task.paths)
+
+    def should_resume(self, path):
+        return False
+
+    def choose_match(self, task):
+        raise NotImplementedError
+
+    def resolve_duplicate(self, task, found_duplicates):
+        if config['import']['quiet']:
+            task.set_choice(action.SKIP)
+        else:
+            task.found_duplicates = found_duplicates
+
+    def find_duplicates(self, task, ident=None):
+        return self.duplicates.find_duplicates(task, ident)
+
+    def choose_item(self, task):
+        raise NotImplementedError
+
+    def choose_candidate(self, task_id, candidate_index):
+        with self.tasks.lock(task_id):
+            task = self.tasks.get(task_id)
+            if not task:
+                print(task, "not in tasks")
+                return
+            task.set_choice(task.candidates[candidate_index])
+            self.set_duplicates(task)
+            self.changed(CHANGED, task_id)
+
+    def merge_duplicates(self, task_id):
+        task = self.take_task(task_id, IMPORTED)
+        if not task:
+            print(task, "not in tasks")
+            return
+        # The merged task has other paths.
+        self.mark_finished(task)
+        # def emitter():
+        duplicate_items = task.duplicate_items(self.lib)
+        _freshen_items(duplicate_items)
+        duplicate_paths = [item.path for item in duplicate_items]
+
+        # Record merged paths in the session so they are not reimported
+        self.mark_merged(duplicate_paths)
+
+        merged_task = ImportTask(None, task.paths + duplicate_paths,
+                                 task.items + duplicate_items)
+
+        self.enqueue([merged_task], lookup=True)
+
+    def query_source(self, items, singleton, interactive=False,
+                     search_ids=(), artist=None, name=None):
+        """Call `autotag.tag_item` or `autotag.tag_album` for `items`
+        through the lookup broker and return `(artist, album, proposal)`.
+        A call for the same files and query as one that is running waits
+        for its result, whose candidates are then mapped onto `items`.
+        The files are part of the key because the candidates' distances
+        depend on them. The whole call takes one token of `lookup_rate`,
+        however many requests the metadata source plugins make for it.
+        """
+        def lookup():
+            if singleton:
+                return items, None, None, autotag.tag_item(
+                    items[0], artist, name, search_ids=search_ids)
+            return (items,) + autotag.tag_album(items, artist, name,
+                                                search_ids=search_ids)
+
+        key = ('item' if singleton else 'album',
+               tuple(item.path for item in items), tuple(search_ids),
+               artist, name)
+        found, cur_artist, cur_album, prop = self.broker.call(
+            key, lookup, interactive)
+        if any(a is not b for a, b in zip(found, items)):
+            prop = Proposal(unpack_candidates(
+                items, pack_candidates(found, prop.candidates)),
+                prop.recommendation)
+        return cur_artist, cur_album, prop
+
+    def tag_album(self, items, search_ids=(), interactive=False):
+        """Call `autotag.tag_album`, or take its result from the lookup
+        cache if these items were looked up before.
+        """
+        if self.lookup_cache is None:
+            return self.query_source(items, False, interactive, search_ids)
+        key = self.lookup_cache.key('album', items, search_ids)
+        cached = self.lookup_cache.get(key, items)
+        if cached:
+            artist, album, candidates, rec = cached
+            return artist, album, Proposal(candidates, rec)
+        artist, album, prop = self.query_source(items, False, interactive,
+                                                search_ids)
+        self.lookup_cache.put(key, items, artist, album, prop.candidates,
+                              prop.recommendation)
+        return artist, album, prop
+
+    def tag_item(self, item, search_ids=(), interactive=False):
+        """Call `autotag.tag_item`, or take its result from the lookup
+        cache if this item was looked up before.
+        """
+        if self.lookup_cache is None:
+            return self.query_source([item], True, interactive,
+                                     search_ids)[2]
+        key = self.lookup_cache.key('item', [item], search_ids)
+        cached = self.lookup_cache.get(key, [item])
+        if cached:
+            _, _, candidates, rec = cached
+            return Proposal(candidates, rec)
+        _, _, prop = self.query_source([item], True, interactive,
+                                       search_ids)
+        self.lookup_cache.put(key, [item], None, None, prop.candidates,
+                              prop.recommendation)
+        return prop
+
+    def lookup_candidates(self, task):
+        """Look up the candidates of `task` like
+        `ImportTask.lookup_candidates`, using the lookup cache.
+        """
+        if task.is_album:
+            artist, album, prop = self.tag_album(task.items, task.search_ids)
+            task.cur_artist = artist
+            task.cur_album = album
+        else:
+            prop = self.tag_item(task.item, task.search_ids)
+        task.candidates = self.keep_candidates(task, prop.candidates)
+        task.rec = prop.recommendation
+
+    def keep_candidates(self, task, candidates):
+        """Return the best `max_candidates` of `candidates`, as a
+        `CandidateList` if `compact_candidates` is enabled.
+        """
+        limit = config['webimport']['max_candidates'].get(int)
+        if limit > 0:
+            candidates = candidates[:limit]
+        if config['webimport']['compact_candidates'].get(bool):
+            return CandidateList(task.items, candidates)
+        return candidates
+
+    def search(self, task, search_ids=(), artist=None, name=None):
+        """Look up `task` by the ids in `search_ids`, or else by `artist`
+        and `name`, ahead of background lookups. Returns the proposal
+        without changing the task.
+        """
+        if search_ids:
+            if task.is_album:
+                return self.tag_album(task.items, search_ids,
+                                      interactive=True)[2]
+            return self.tag_item(task.item, search_ids, interactive=True)
+        return self.query_source(task.items, not task.is_album,
+                                 interactive=True, artist=artist,
+                                 name=name)[2]
+
+    def search_id(self, task_id, search_id):
+        task = self.tasks.get(task_id)
+        if not task:
+            print(task, "not in tasks")
+            return
+        prop = self.search(task, search_id.split())
+        self.set_candidates(task_id, task, prop)
+        return task
+
+    def search_name(self, task_id, name, artist):
+        task = self.tasks.get(task_id)
+        if not task:
+            print(task, "not in tasks")
+            return
+        prop = self.search(task, artist=artist, name=name)
+        self.set_candidates(task_id, task, prop)
+        return task
+
+    def set_candidates(self, task_id, task, prop):
+        """Make the candidates of the `prop` proposal, which was looked up
+        without holding the lock of `task`, the candidates of the task if
+        it found any and the task is still pending.
+        """
+        if len(prop.candidates) == 0:
+            return
+        with self.tasks.lock(task_id):
+            if self.tasks.get(task_id) is not task:
+                return
+            task.candidates = self.keep_candidates(task, prop.candidates)
+            task.rec = prop.recommendation
+            self.flag_duplicates(task)
+            self.changed(CANDIDATES, task_id)
+
+    def as_tracks(self, task_id):
+        def emitter(task):
+            for item in task.items:
+                task = SingletonImportTask(task.toppath, item)
+                for new_task in task.handle_created(self):
+                    yield new_task
+            yield SentinelImportTask(task.toppath, task.paths)
+
+        task = self.take_task(task_id, IMPORTED)
+        if not task:
+            print(task, "not in tasks")
+            return
+        # Its items are imported as tasks of their own.
+        self.mark_finished(task)
+
+        self.enqueue(emitter(task), lookup=True)
+
+    def import_task(self, task_id):
+        if self.import_tasks([task_id]):
+            return True
+
+    def import_tasks(self, task_ids):
+        """Hand the tasks `task_ids` with the choices set on them to the
+        decision pipeline. Returns the ids of the queued tasks.
+        """
+        tasks = []
+        for task_id in task_ids:
+            task = self.take_task(task_id, IMPORTED)
+            if not task:
+                log.debug(u'task {0} is not pending', task_id)
+                continue
+            tasks.append(task_id)
+            self.track_progress(task_id, task)
+            self.enqueue([task])
+        return tasks
+
+    def track_progress(self, task_id, task):
+        """Start reporting the file operations of `task` under `task_id`
+        in `progress`.
+        """
+        sizes = [(item, item.try_filesize()) for item in task.items]
+        with self._decisions_cond:
+            self.progress[task_id] = {
+                'state': 'queued',
+                'files': len(sizes),
+                'files_done': 0,
+                'bytes': sum(size for _, size in sizes),
+                'bytes_done': 0,
+            }
+            self._progress_ids[id(task)] = task_id
+            for item, size in sizes:
+                self._item_tasks[id(item)] = (task_id, size)
+
+    def progress_report(self):
+        """A copy of `progress`, taken while no task changes it."""
+        with self._decisions_cond:
+            return {task_id: dict(entry)
+                    for task_id, entry in self.progress.items()}
+
+    def file_done(self, item):
+        """Count a moved or copied file towards its task's progress."""
+        with self._decisions_cond:
+            task_id, size = self._item_tasks.pop(id(item), (None, 0))
+            if task_id in self.progress:
+                self.progress[task_id]['files_done'] += 1
+                self.progress[task_id]['bytes_done'] += size
+
+    def enqueue(self, tasks, lookup=False):
+        """Queue `tasks` for the decision pipeline, which is started if
+        it is not running. With `lookup`, candidates are looked up for the
+        tasks first and they are handled like freshly scanned tasks.
+        """
+        with self._decisions_cond:
+            self.importing += 1
+            self.decisions.put((tasks, lookup))
+            if self._decisions_thread is None or \
+                    not self._decisions_thread.is_alive():
+                self._decisions_thread = threading.Thread(
+                    target=self._run_decisions, name='webimport-decisions',
+                    daemon=True)
+                self._decisions_thread.start()
+
+    def _run_decisions(self):
+        self.set_config(config['import'])
+        try:
+            self.new_pipeline(self.decision_source(), self.generate_stages(),
+                              source=None)
+        except Exception as exc:
+            log.error(u'import pipeline failed: {0}', exc)
+            with self._decisions_cond:
+                self.importing = self.decisions.qsize()
+                self._decisions_cond.notify_all()
+
+    def decision_source(self):
+        """Yield the tasks queued with `enqueue` until the session is
+        closed.
+        """
+        while True:
+            entry = self.decisions.get()
+            if entry is None:
+                return
+            tasks, lookup = entry
+            if lookup:
+                out = [task for task in map(self.settle, self.look_up(tasks))
+                       if task is not None]
+            else:
+                out = list(tasks)
+                for task in out:
+                    apply_choice(self, task)
+            with self._decisions_cond:
+                self.importing += len(out) - 1
+                self._in_flight.update(id(task) for task in out)
+                self._decisions_cond.notify_all()
+            for task in out:
+                yield task
+
+    def task_started(self, task):
+        with self._decisions_cond:
+            task_id = self._progress_ids.get(id(task))
+            if task_id in self.progress:
+                self.progress[task_id]['state'] = 'importing'
+
+    def task_done(self, task):
+        with self._decisions_cond:
+            task_id = self._progress_ids.pop(id(task), None)
+            if task_id in self.progress:
+                self.progress[task_id]['state'] = 'done'
+                self._forget_progress(task_id)
+            for item in task.items or ():
+                self._item_tasks.pop(id(item), None)
+            if id(task) in self._in_flight:
+                self._in_flight.discard(id(task))
+                self.importing -= 1
+                self._decisions_cond.notify_all()
+
+    def _forget_progress(self, task_id):
+        """Note that `task_id` is done and drop the progress of the
+        oldest finished tasks beyond the last `PROGRESS_KEPT`.
+        """
+        self._progress_done.append(task_id)
+        while len(self._progress_done) > PROGRESS_KEPT:
+            old = self._progress_done.popleft()
+            # Imported again since, its progress is current.
+            if self.progress.get(old, {}).get('state') == 'done' and \
+                    old not in self._progress_done:
+                del self.progress[old]
+
+    def memory_usage(self):
+        """Report the number of pending tasks and their candidates, and
+        estimates of the bytes held by the tasks and their cached JSON.
+        """
+        tasks = list(self.tasks.snapshot().values())
+        candidates = full = packed = 0
+        for task in tasks:
+            candidates += len(task.candidates)
+            if isinstance(task.candidates, CandidateList):
+                full += len(task.candidates.full)
+                packed += task.candidates.packed_size
+            else:
+                full += len(task.candidates)
+        return {
+            'tasks': len(tasks),
+            'candidates': candidates,
+            'full_candidates': full,
+            'compact_candidates': candidates - full,
+            'packed_bytes': packed,
+            'task_bytes': deep_size(tasks),
+            'json_cache_bytes': deep_size(self.json_cache),
+        }
+
+    def wait(self, timeout=None):
+        """Wait until all queued decisions went through the pipeline.
+        Returns False if they did not within `timeout` seconds.
+        """
+        with self._decisions_cond:
+            return self._decisions_cond.wait_for(
+                lambda: self.importing <= 0, timeout)
+
+    def close(self):
+        """Stop the decision pipeline once the queued decisions are done.
+        """
+        self.decisions.put(None)
+
+    def decide(self, decisions):
+        """Carry out `(task_id, action, candidate_index)` decisions, where
+        `action` is one of `apply`, `asIs` and `skip`. All tasks that can
+        be imported right away go through one pipeline run; tasks with
+        duplicates in the library stay pending for the user to resolve.
+        If any decision cannot be carried out, none is and they are
+        reported as `invalid`.
+        """
+        result = {'imported': [], 'skipped': [], 'duplicates': [],
+                  'missing': [], 'invalid': []}
+        for task_id, action_name, candidate_index in decisions:
+            with self.tasks.lock(task_id):
+                task = self.tasks.get(task_id)
+                error = task and self.invalid_decision(task, action_name,
+                                                       candidate_index)
+            if error:
+                result['invalid'].append({'task_index': task_id,
+                                          'error': error})
+        if result['invalid']:
+            return result
+        to_import = []
+        for task_id, action_name, candidate_index in decisions:
+            with self.tasks.lock(task_id):
+                task = self.tasks.get(task_id)
+                if not task:
+                    result['missing'].append(task_id)
+                    continue
+                # The candidates may have been replaced since.
+                error = self.invalid_decision(task, action_name,
+                                              candidate_index)
+                if error:
+                    result['invalid'].append({'task_index': task_id,
+                                              'error': error})
+                    continue
+                if action_name == 'skip':
+                    self.skip_task(task_id)
+                    result['skipped'].append(task_id)
+                    continue
+                if action_name == 'asIs':
+                    task.set_choice(action.ASIS)
+                elif candidate_index is not None:
+                    task.set_choice(task.candidates[candidate_index])
+                elif not task.match:
+                    task.set_choice(task.candidates[0])
+                if self.resolved_duplicates(task_id):
+                    to_import.append(task_id)
+                else:
+                    result['duplicates'].append(task_id)
+        result['imported'] = self.import_tasks(to_import)
+        return result
+
+    @staticmethod
+    def invalid_decision(task, action_name, candidate_index):
+        """Why the decision cannot be carried out on `task`, None if it
+        can.
+        """
+        if action_name not in ('apply', 'asIs', 'skip'):
+            return u'unknown action {0!r}'.format(action_name)
+        if action_name != 'apply':
+            return None
+        if candidate_index is None:
+            if task.match or task.candidates:
+                return None
+            return u'no candidates'
+        if isinstance(candidate_index, bool) or \
+                not isinstance(candidate_index, int):
+            return u'candidate_index is not an integer'
+        if not 0 <= candidate_index < len(task.candidates):
+            return u'no candidate {0}'.format(candidate_index)
+        return None
+
+    def strong_decisions(self):
+        """Decisions applying the best candidate of every pending task
+        with a strong recommendation.
+        """
+        return [(task_id, 'apply', 0) for task_id, task
+                in self.tasks.items()
+                if task.rec == Recommendation.strong and task.candidates]
+
+    def read_tasks(self):
+        """Wrap `scan_tasks` to keep track of the scan progress. With more
+        than one of `read_workers`, the files of that many directories are
+        read at the same time.
+        """
+        self.state = SCANNING
+        workers = config['webimport']['read_workers'].get(int)
+        if workers > 1:
+            read_map = functools.partial(ordered_map, workers=workers)
+        else:
+            read_map = map
+        for task in scan_tasks(self, self.scan_index, read_map):
+            if type(task) != SentinelImportTask:
+                self.scanned += 1
+            yield task
+        self.state = LOOKING_UP
+
+    def run(self):
+        self.set_config(config['import'])
+        self.resume()
+        self.lookup(self.read_tasks())
+        self.state = DONE
+        plugins.send('import', lib=self.lib, paths=self.paths)
+
+    def resolved_duplicates(self, task_id):
+        with self.tasks.lock(task_id):
+            task = self.tasks.get(task_id)
+            if not task:
+                print(task, "not in tasks")
+                return
+            self.set_config(config['import'])
+            # Found for the best candidate while pending; the choice
+            # may differ.
+            if hasattr(task, 'found_duplicates'):
+                del task.found_duplicates
+            resolve_duplicates(self, task)
+            if hasattr(task, 'found_duplicates'):
+                self.changed(CHANGED, task_id)
+                return False
+            return True
+
+    def new_pipeline(self, tasks, stages, source='read_tasks'):
+        """Run `tasks` through the `(name, coroutine)` pairs in `stages`,
+        timing each stage. `source` names the stage producing the tasks,
+        None leaves it untimed.
+        """
+        if type(tasks) == list:
+            task_iter = iter(tasks)
+        else:
+            task_iter = tasks
+
+        pl = pipeline.Pipeline(timed_pipeline(source, task_iter, stages))
+        plugins.send('import_begin', session=self)
+        if config['threaded']:
+            pl.run_parallel(QUEUE_SIZE)
+        else:
+            pl.run_sequential()
+
+    def lookup(self, tasks):
+        """Run the pipeline that looks up candidates for `tasks`. With
+        `lookup_workers` above one the lookups run on a thread pool ahead
+        of the pipeline, which still receives the tasks in order.
+        """
+        workers = config['webimport']['lookup_workers'].get(int)
+        if workers > 1:
+            self.new_pipeline(self.look_up(tasks), self.match_stages(),
+                              source='read_tasks_and_lookup')
+        else:
+            self.new_pipeline(tasks, self.lookup_stages())
+
+    def look_up(self, tasks):
+        """Look up candidates for `tasks` and yield them in order, on a
+        thread pool if `lookup_workers` is above one.
+        """
+        workers = config['webimport']['lookup_workers'].get(int)
+        lookup = functools.partial(lookup_task, self)
+        if workers > 1:
+            return ordered_map(lookup, tasks, workers)
+        return map(lookup, tasks)
+
+    def settle(self, task):
+        """Apply the best match to a looked up task if the recommendation
+        is strong enough, otherwise add it to the pending tasks. Returns
+        None for pending tasks: they belong to the request threads now and
+        must not travel further down the pipeline.
+        """
+        if type(task) != SentinelImportTask:
+            self.looked_up += 1
+        if _summary_judgment(task.rec) == importer.action.APPLY:
+            task.set_choice(task.candidates[0])
+            if self.apply_settled(task):
+                metrics().add(AUTO_DECIDED, 1, rule='strong',
+                              action='skip' if task.skip else 'apply')
+                return task
+        elif type(task) == SentinelImportTask:
+            return task
+        else:
+            rule = self.policy.match(self, task)
+            if rule is not None and self.decide_by(rule, task):
+                return task
+        self.flag_duplicates(task)
+        self.add_task(task)
+        return None
+
+    def flag_duplicates(self, task):
+        """Choose the best candidate of the pending `task` and set its
+        `found_duplicates` if the library has duplicates of it, as an
+        apply would, so that the user sees them before deciding. Other
+        tasks are left with the choice to skip.
+        """
+        if task.candidates:
+            task.set_choice(task.candidates[0])
+            if self.set_duplicates(task):
+                return
+        task.set_choice(action.SKIP)
+
+    def set_duplicates(self, task):
+        """Set `found_duplicates` on `task` to the duplicates of its
+        choice in the index, or remove it if there are none. Returns
+        whether there are.
+        """
+        found = self.find_duplicates(task)
+        if found:
+            task.found_duplicates = found
+        elif hasattr(task, 'found_duplicates'):
+            del task.found_duplicates
+        return bool(found)
+
+    def decide_by(self, rule, task):
+        """Set the choice of the auto-apply `rule` on `task`. Returns
+        False if the task must wait for the user to resolve duplicates.
+        """
+        if rule.action == 'skip':
+            task.set_choice(action.SKIP)
+        else:
+            task.set_choice(action.ASIS if rule.action == 'asIs'
+                            else task.candidates[0])
+            if not self.apply_settled(task):
+                return False
+        metrics().add(AUTO_DECIDED, 1, rule=rule.name,
+                      action='skip' if task.skip else rule.action)
+        return True
+
+    def apply_settled(self, task):
+        """Resolve the duplicates of `task`, whose choice is set, and
+        apply the choice unless that skipped the task. Returns False if
+        the task must wait for the user to resolve duplicates.
+        """
+        resolve_duplicates(self, task)
+        if hasattr(task, 'found_duplicates'):
+            del task.found_duplicates
+            return False
+        if not task.skip:
+            apply_choice(self, task)
+        return True
+
+    def lookup_stages(self):
+        return [('lookup_candidates', pipeline.stage(lookup_task)(self))] + \
+            self.match_stages()
+
+    def match_stages(self):
+        return [('settle', save_or_set_apply_matches(self))] + \
+            self.generate_stages()
+
+    def generate_stages(self):
+        stages = []
+        for stage_func in plugins.early_import_stages() + \
+                plugins.import_stages():
+            name = getattr(stage_func, '__qualname__', repr(stage_func))
+            stages.append(('plugin:' + name, plugin_stage(self, stage_func)))
+
+        files = manipulate_files(self)
+        next(files)
+        stages.append(('manipulate_files', file_stage(self, files)))
+        return stages
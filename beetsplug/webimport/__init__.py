@@ -1,510 +1,1266 @@
-# -*- coding: utf-8 -*-
-# This file is part of beets.
-# Copyright 2016, Adrian Sampson.
-#
-# Permission is hereby granted, free of charge, to any person obtaining
-# a copy of this software and associated documentation files (the
-# "Software"), to deal in the Software without restriction, including
-# without limitation the rights to use, copy, modify, merge, publish,
-# distribute, sublicense, and/or sell copies of the Software, and to
-# permit persons to whom the Software is furnished to do so, subject to
-# the following conditions:
-#
-# The above copyright notice and this permission notice shall be
-# included in all copies or substantial portions of the Software.
-
-"""A Web interface to beets."""
-from __future__ import division, absolute_import, print_function
-
-from typing import Union
-
-from beets.autotag import Distance, AlbumMatch, AlbumInfo, TrackInfo, \
-    TrackMatch
-from flask.json import jsonify, JSONEncoder
-
-from beets.importer import action, SingletonImportTask, ImportTask, \
-    _freshen_items
-from beets.plugins import BeetsPlugin
-from beets import ui, plugins
-from beets import util
-import beets.library
-import flask
-from flask import g, request
-from werkzeug.routing import BaseConverter, PathConverter
-import os
-from unidecode import unidecode
-import json
-import base64
-
-# Utilities.
-from beets.ui.commands import dist_string, penalty_string, disambig_string
-from beetsplug.webimport.WebImporter import WebImporter
-
-
-def _rep(obj, expand=False):
-    """Get a flat -- i.e., JSON-ish -- representation of a beets Item or
-    Album object. For Albums, `expand` dictates whether tracks are
-    included.
-    """
-    out = dict(obj)
-
-    if isinstance(obj, beets.library.Item):
-        if app.config.get('INCLUDE_PATHS', False):
-            out['path'] = util.displayable_path(out['path'])
-        else:
-            del out['path']
-
-        # Filter all bytes attributes and convert them to strings.
-        for key, value in out.items():
-            if isinstance(out[key], bytes):
-                out[key] = base64.b64encode(value).decode('ascii')
-
-        # Get the size (in bytes) of the backing file. This is useful
-        # for the Tomahawk resolver API.
-        try:
-            out['size'] = os.path.getsize(util.syspath(obj.path))
-        except OSError:
-            out['size'] = 0
-
-        return out
-
-    elif isinstance(obj, beets.library.Album):
-        del out['artpath']
-        if expand:
-            out['items'] = [_rep(item) for item in obj.items()]
-        return out
-
-
-def json_generator(items, root, expand=False):
-    """Generator that dumps list of beets Items or Albums as JSON
-
-    :param root:  root key for JSON
-    :param items: list of :class:`Item` or :class:`Album` to dump
-    :param expand: If true every :class:`Album` contains its items in the json
-                   representation
-    :returns:     generator that yields strings
-    """
-    yield '{"%s":[' % root
-    first = True
-    for item in items:
-        if first:
-            first = False
-        else:
-            yield ','
-        yield json.dumps(_rep(item, expand=expand))
-    yield ']}'
-
-
-def is_expand():
-    """Returns whether the current request is for an expanded response."""
-
-    return flask.request.args.get('expand') is not None
-
-
-def resource(name):
-    """Decorates a function to handle RESTful HTTP requests for a resource.
-    """
-
-    def make_responder(retriever):
-        def responder(ids):
-            entities = [retriever(id) for id in ids]
-            entities = [entity for entity in entities if entity]
-
-            if len(entities) == 1:
-                return flask.jsonify(_rep(entities[0], expand=is_expand()))
-            elif entities:
-                return app.response_class(
-                    json_generator(entities, root=name),
-                    mimetype='application/json'
-                )
-            else:
-                return flask.abort(404)
-
-        responder.__name__ = 'get_{0}'.format(name)
-        return responder
-
-    return make_responder
-
-
-def resource_query(name):
-    """Decorates a function to handle RESTful HTTP queries for resources.
-    """
-
-    def make_responder(query_func):
-        def responder(queries):
-            return app.response_class(
-                json_generator(
-                    query_func(queries),
-                    root='results', expand=is_expand()
-                ),
-                mimetype='application/json'
-            )
-
-        responder.__name__ = 'query_{0}'.format(name)
-        return responder
-
-    return make_responder
-
-
-def resource_list(name):
-    """Decorates a function to handle RESTful HTTP request for a list of
-    resources.
-    """
-
-    def make_responder(list_all):
-        def responder():
-            return app.response_class(
-                json_generator(list_all(), root=name, expand=is_expand()),
-                mimetype='application/json'
-            )
-
-        responder.__name__ = 'all_{0}'.format(name)
-        return responder
-
-    return make_responder
-
-
-def _get_unique_table_field_values(model, field, sort_field):
-    """ retrieve all unique values belonging to a key from a model """
-    if field not in model.all_keys() or sort_field not in model.all_keys():
-        raise KeyError
-    with g.lib.transaction() as tx:
-        rows = tx.query('SELECT DISTINCT "{0}" FROM "{1}" ORDER BY "{2}"'
-                        .format(field, model._table, sort_field))
-    return [row[0] for row in rows]
-
-
-class IdListConverter(BaseConverter):
-    """Converts comma separated lists of ids in urls to integer lists.
-    """
-
-    def to_python(self, value):
-        ids = []
-        for id in value.split(','):
-            try:
-                ids.append(int(id))
-            except ValueError:
-                pass
-        return ids
-
-    def to_url(self, value):
-        return ','.join(value)
-
-
-class QueryConverter(PathConverter):
-    """Converts slash separated lists of queries in the url to string list.
-    """
-
-    def to_python(self, value):
-        return value.split('/')
-
-    def to_url(self, value):
-        return ','.join(value)
-
-
-class EverythingConverter(PathConverter):
-    regex = '.*?'
-
-
-class TaskEncoder(JSONEncoder):
-
-    def default(self, o):
-        if isinstance(o, SingletonImportTask):
-            return {
-                'artist': o.item.artist,
-                'title': o.item.title,
-                'match': self.default(o.match),
-                'candidates': self.default(o.candidates),
-                'imported_items': o.imported_items() if
-                hasattr(o, 'found_duplicates') else None,
-                'found_duplicates': self.default(o.found_duplicates) if
-                hasattr(o, 'found_duplicates') else None,
-            }
-        if isinstance(o, ImportTask):
-            return {
-                'candidates': self.default(o.candidates),
-                'match': self.default(o.match),
-                'cur_album': o.cur_album,
-                'cur_artist': o.cur_artist,
-                'is_album': o.is_album,
-                'items': self.default(o.items),
-                'paths': [str(p) for p in o.paths],
-                # 'toppath': o.toppath,
-                'imported_items': o.imported_items() if
-                hasattr(o, 'found_duplicates') else None,
-                'found_duplicates': self.default(o.found_duplicates) if
-                hasattr(o, 'found_duplicates') else None,
-            }
-        if isinstance(o, AlbumMatch):
-            return {
-                'distance': self.default(o.distance),
-                'info': o.info,
-                'mapping': [(self.default(key), value)
-                            for key, value in o.mapping.items()],
-                'extra_tracks': o.extra_tracks
-            }
-        if isinstance(o, TrackMatch):
-            return {
-                'distance': self.default(o.distance),
-                'info': o.info,
-            }
-        if isinstance(o, Distance):
-            return {
-                'distance': o.distance,
-                'penalties': o.keys(),
-                'tracks': dict((x.track_id, self.default(y))
-                               for x, y in o.tracks.items())
-                if hasattr(o, 'tracks') else dict()
-            }
-        if isinstance(o, list):
-            return [self.default(x) for x in o]
-        if isinstance(o, AlbumInfo):
-            return o.__dict__
-        if isinstance(o, beets.library.Item):
-            return {
-                'title': o.title.strip(),
-                'path': o.path,
-                'track': o.track,
-                'format': o.format,
-                'bitrate': o.bitrate,
-                'filesize': o.filesize,
-                'length': o.length
-            }
-        if isinstance(o, beets.library.Album):
-            return {
-                'items': self.default(list(o.items()))
-            }
-        return str(o)
-
-
-# Flask setup.
-
-app = flask.Flask(__name__)
-app.url_map.converters['idlist'] = IdListConverter
-app.url_map.converters['query'] = QueryConverter
-app.url_map.converters['everything'] = EverythingConverter
-app.json_encoder = TaskEncoder
-
-session: Union[WebImporter, None] = None
-
-
-@app.before_request
-def before_request():
-    g.lib = app.config['lib']
-
-
-@app.route('/', methods=['GET', 'POST'])
-def run_import():
-    global session
-    if request.method == 'GET':
-        return flask.render_template('import.html')
-    elif request.method == 'POST':
-        form = request.form
-        if not form or 'path' not in form or not type(form['path']) is str:
-            return "paths must be a set"
-        paths = [form['path']]
-        session = None
-        session = WebImporter(g.lib, None, paths, None)
-        session.run()
-        return flask.render_template('import.html')
-
-
-@app.route('/api/<int:task_id>')
-def import_info(task_id):
-    global session
-    return jsonify(session.tasks[task_id])
-
-
-@app.route('/api/tasks')
-def get_tasks():
-    global session
-    if session:
-        return jsonify(session.tasks)
-    return jsonify([])
-
-
-@app.route('/api/candidate', methods=['PUT'])
-def import_choose_candidate():
-    global session
-    data = request.get_json()
-    session.choose_candidate(data['task_index'], data['candidate_index'])
-    return jsonify(session.tasks[data['task_index']])
-
-
-@app.route('/api/skip', methods=['PUT'])
-def import_skip():
-    global session
-    data = request.get_json()
-    task = session.tasks.pop(data['task_index'])
-    return jsonify(task)
-
-
-@app.route('/api/searchId', methods=['PUT'])
-def search_id():
-    global session
-    data = request.get_json()
-    task = session.search_id(data['task_index'], data['id'])
-    return jsonify(task)
-
-
-@app.route('/api/searchName', methods=['PUT'])
-def search_name():
-    global session
-    data = request.get_json()
-    task = session.search_name(data['task_index'], data['artist'],
-                               data['name'])
-    return jsonify(task)
-
-
-@app.route('/api/asIs', methods=['PUT'])
-def import_as_is():
-    global session
-    data = request.get_json()
-    task = session.tasks[data['task_index']]
-    task.set_choice(action.ASIS)
-    if session.resolved_duplicates(data['task_index']):
-        session.import_task(data['task_index'])
-    return jsonify(task)
-
-
-@app.route('/api/asTracks', methods=['PUT'])
-def import_as_tracks():
-    global session
-    data = request.get_json()
-    task = session.tasks[data['task_index']]
-    task.set_choice(action.TRACKS)
-    session.as_tracks(data['task_index'])
-    return jsonify(task)
-
-
-@app.route('/api/resolveDuplicates', methods=['PUT'])
-def import_resolve_duplicates():
-    global session
-    data = request.get_json()
-    task = session.tasks[data['task_index']]
-    if not task.match:
-        task.set_choice(task.candidates[0])
-
-    sel = data['duplicate_action']
-    if sel == u'k':
-        # Keep both. Do nothing; leave the choice intact.
-        pass
-    elif sel == u'r':
-        # Remove old.
-        task.should_remove_duplicates = True
-    elif sel == u'm':
-        session.merge_duplicates(data['task_index'])
-        return jsonify([])
-
-    session.import_task(data['task_index'])
-    return jsonify(task)
-
-
-@app.route('/api/apply', methods=['PUT'])
-def import_apply():
-    global session
-    data = request.get_json()
-    task = session.tasks[data['task_index']]
-    if not task.match:
-        task.set_choice(task.candidates[0])
-    if session.resolved_duplicates(data['task_index']):
-        session.import_task(data['task_index'])
-    return jsonify(task)
-
-
-# Plugin hook.
-
-class WebImportPlugin(BeetsPlugin):
-    def __init__(self):
-        super(WebImportPlugin, self).__init__()
-        self.config.add({
-            'host': u'127.0.0.1',
-            'port': 8337,
-            'cors': '',
-            'cors_supports_credentials': False,
-            'reverse_proxy': False,
-            'include_paths': False,
-        })
-
-    def commands(self):
-        cmd = ui.Subcommand('webimport', help=u'start a import web interface')
-        cmd.parser.add_option(u'-d', u'--debug', action='store_true',
-                              default=False, help=u'debug mode')
-
-        def func(lib, opts, args):
-            args = ui.decargs(args)
-            if args:
-                self.config['host'] = args.pop(0)
-            if args:
-                self.config['port'] = int(args.pop(0))
-
-            app.config['lib'] = lib
-            # Normalizes json output
-            app.config['JSONIFY_PRETTYPRINT_REGULAR'] = False
-
-            app.config['INCLUDE_PATHS'] = self.config['include_paths']
-
-            # Enable CORS if required.
-            if self.config['cors']:
-                self._log.info(u'Enabling CORS with origin: {0}',
-                               self.config['cors'])
-                from flask_cors import CORS
-                app.config['CORS_ALLOW_HEADERS'] = "Content-Type"
-                app.config['CORS_RESOURCES'] = {
-                    r"/*": {"origins": self.config['cors'].get(str)}
-                }
-                CORS(
-                    app,
-                    supports_credentials=self.config[
-                        'cors_supports_credentials'
-                    ].get(bool)
-                )
-
-            # Allow serving behind a reverse proxy
-            if self.config['reverse_proxy']:
-                app.wsgi_app = ReverseProxied(app.wsgi_app)
-
-            # Start the web application.
-            app.run(host=self.config['host'].as_str(),
-                    port=self.config['port'].get(int),
-                    debug=opts.debug, threaded=True)
-
-        cmd.func = func
-        return [cmd]
-
-
-class ReverseProxied(object):
-    '''Wrap the application in this middleware and configure the
-    front-end server to add these headers, to let you quietly bind
-    this to a URL other than / and to an HTTP scheme that is
-    different than what is used locally.
-
-    In nginx:
-    location /myprefix {
-        proxy_pass http://192.168.0.1:5001;
-        proxy_set_header Host $host;
-        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
-        proxy_set_header X-Scheme $scheme;
-        proxy_set_header X-Script-Name /myprefix;
-        }
-
-    From: http://flask.pocoo.org/snippets/35/
-
-    :param app: the WSGI application
-    '''
-
-    def __init__(self, app):
-        self.app = app
-
-    def __call__(self, environ, start_response):
-        script_name = environ.get('HTTP_X_SCRIPT_NAME', '')
-        if script_name:
-            environ['SCRIPT_NAME'] = script_name
-            path_info = environ['PATH_INFO']
-            if path_info.startswith(script_name):
-                environ['PATH_INFO'] = path_info[len(script_name):]
-
-        scheme = environ.get('HTTP_X_SCHEME', '')
-        if scheme:
-            environ['wsgi.url_scheme'] = scheme
-        return self.app(environ, start_response)
+# -*- coding: utf-8 -*-
+# This file is part of beets.
+# Copyright 2016, Adrian Sampson.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+"""A Web interface to beets."""
+from __future__ import division, absolute_import, print_function
+
+from beets.autotag import Distance, AlbumMatch, AlbumInfo, TrackInfo, \
+    TrackMatch
+from flask.json import jsonify, JSONEncoder
+
+from beets.importer import action, SingletonImportTask, ImportTask, \
+    _freshen_items
+from beets.plugins import BeetsPlugin
+from beets import ui, plugins
+from beets import util
+from beets import dbcore
+import beets.library
+import flask
+from flask import g, request
+from werkzeug.routing import BaseConverter, PathConverter
+import os
+from unidecode import unidecode
+import json
+import base64
+import functools
+import hashlib
+import itertools
+import time
+import uuid
+
+# Utilities.
+from beets.ui.commands import dist_string, penalty_string, disambig_string
+from beetsplug.webimport.ApplyPolicy import ApplyPolicy, apply_policy
+from beetsplug.webimport.CandidateList import CandidateList, \
+    CandidateSummary
+from beetsplug.webimport.Compression import choose_encoding, \
+    compress_response
+from beetsplug.webimport.EventLog import ADDED, CANDIDATES, CHANGED, \
+    SEARCH
+from beetsplug.webimport.FieldIndex import FieldIndex, MODELS
+from beetsplug.webimport.ImportJob import JobRunner
+from beetsplug.webimport.LookupBroker import lookup_broker
+from beetsplug.webimport.Metrics import REQUEST_SECONDS, metrics
+from beetsplug.webimport.SearchJob import SearchRunner
+from beetsplug.webimport.Server import drain, open_stream, serve
+from beetsplug.webimport.SessionRegistry import SessionRegistry
+from beetsplug.webimport.SessionSnapshot import session_snapshot
+from beetsplug.webimport.WebImporter import WebImporter
+
+
+@functools.lru_cache(maxsize=65536)
+def _file_size(path, mtime):
+    """The size of the file at `path`, cached by the modification time
+    stored in the library.
+    """
+    try:
+        return os.path.getsize(util.syspath(path))
+    except OSError:
+        return 0
+
+
+def _values(obj):
+    """Return the fixed and flexible fields of `obj` like `dict(obj)`,
+    without the album fallback of items and without looking up the
+    computed fields for every key.
+    """
+    getters = obj._getters()
+    fixed = obj._values_fixed
+    flex = obj._values_flex
+    fixed_keys = set(fixed.keys())
+    out = dict()
+    for key in obj._fields:
+        if key in getters:
+            out[key] = getters[key](obj)
+        elif key in fixed_keys:
+            out[key] = fixed[key]
+        else:
+            out[key] = obj._type(key).null
+    for key in flex.keys():
+        out[key] = getters[key](obj) if key in getters else flex[key]
+    return out
+
+
+def _item_values(item, album_values):
+    """Return `dict(item)` given the `_values` of the item's album, None
+    for singletons.
+    """
+    out = _values(item)
+    if album_values:
+        getters = item._getters()
+        for key, value in album_values.items():
+            if key not in out:
+                out[key] = getters[key](item) if key in getters else value
+    return out
+
+
+def _rep(obj, expand=False, items=None, album_values=None):
+    """Get a flat -- i.e., JSON-ish -- representation of a beets Item or
+    Album object. For Albums, `expand` dictates whether tracks are
+    included; `items` are the album's items if they were already fetched.
+    For Items, `album_values` are the `_values` of their album if they
+    were already fetched.
+    """
+    if isinstance(obj, beets.library.Item):
+        if album_values is None:
+            out = dict(obj)
+        else:
+            out = _item_values(obj, album_values)
+
+        if app.config.get('INCLUDE_PATHS', False):
+            out['path'] = util.displayable_path(out['path'])
+        else:
+            del out['path']
+
+        # Filter all bytes attributes and convert them to strings.
+        for key, value in out.items():
+            if isinstance(out[key], bytes):
+                out[key] = base64.b64encode(value).decode('ascii')
+
+        # Get the size (in bytes) of the backing file. This is useful
+        # for the Tomahawk resolver API.
+        out['size'] = _file_size(obj.path, obj.mtime)
+
+        return out
+
+    elif isinstance(obj, beets.library.Album):
+        values = _values(obj)
+        out = dict(values)
+        del out['artpath']
+        if expand:
+            if items is None:
+                items = obj.items()
+            out['items'] = [_rep(item, album_values=values)
+                            for item in items]
+        return out
+
+
+class OneOfQuery(dbcore.query.Query):
+    """Matches the objects whose `field` is one of `values`."""
+
+    def __init__(self, field, values):
+        self.field = field
+        self.values = list(values)
+
+    def clause(self):
+        return '"{0}" IN ({1})'.format(
+            self.field, ','.join('?' * len(self.values))), self.values
+
+    def match(self, obj):
+        return obj.get(self.field) in self.values
+
+
+def _album_items(albums):
+    """Fetch the items of `albums` in one query and group them by album
+    id, in the order `Album.items` returns them.
+    """
+    if not albums:
+        return dict()
+    grouped = dict((album.id, []) for album in albums)
+    for item in albums[0]._db.items(OneOfQuery('album_id', grouped)):
+        grouped[item.album_id].append(item)
+    return grouped
+
+
+def _item_albums(items):
+    """Fetch the albums of `items` in one query and return the `_values`
+    of each by album id.
+    """
+    ids = set(item.album_id for item in items if item.album_id)
+    if not ids:
+        return dict()
+    return dict((album.id, _values(album)) for album
+                in items[0]._db.albums(OneOfQuery('id', ids)))
+
+
+def _batch_reps(batch, expand):
+    """Return the representations of the Items and Albums in `batch`,
+    fetching the albums of the items or, with `expand`, the items of the
+    albums in one query each.
+    """
+    items = [obj for obj in batch if isinstance(obj, beets.library.Item)]
+    albums = [obj for obj in batch if isinstance(obj, beets.library.Album)]
+    item_albums = _item_albums(items) if items else dict()
+    album_items = _album_items(albums) if albums and expand else dict()
+    reps = []
+    for obj in batch:
+        if isinstance(obj, beets.library.Item):
+            reps.append(_rep(obj, album_values=item_albums.get(
+                obj.album_id, dict())))
+        else:
+            reps.append(_rep(obj, expand, album_items.get(obj.id)))
+    return reps
+
+
+def json_generator(items, root, expand=False, batch_size=500):
+    """Generator that dumps list of beets Items or Albums as JSON
+
+    :param root:  root key for JSON
+    :param items: list of :class:`Item` or :class:`Album` to dump
+    :param expand: If true every :class:`Album` contains its items in the json
+                   representation
+    :param batch_size: number of objects fetched and encoded at once
+    :returns:     generator that yields strings
+    """
+    yield '{"%s":[' % root
+    first = True
+    items = iter(items)
+    while True:
+        batch = list(itertools.islice(items, batch_size))
+        if not batch:
+            break
+        chunk = json.dumps(_batch_reps(batch, expand))[1:-1]
+        if first:
+            first = False
+        else:
+            chunk = ',' + chunk
+        yield chunk
+    yield ']}'
+
+
+def is_expand():
+    """Returns whether the current request is for an expanded response."""
+
+    return flask.request.args.get('expand') is not None
+
+
+def resource(name):
+    """Decorates a function to handle RESTful HTTP requests for a resource.
+    """
+
+    def make_responder(retriever):
+        def responder(ids):
+            entities = [retriever(id) for id in ids]
+            entities = [entity for entity in entities if entity]
+
+            if len(entities) == 1:
+                return flask.jsonify(_rep(entities[0], expand=is_expand()))
+            elif entities:
+                return app.response_class(
+                    json_generator(entities, root=name),
+                    mimetype='application/json'
+                )
+            else:
+                return flask.abort(404)
+
+        responder.__name__ = 'get_{0}'.format(name)
+        return responder
+
+    return make_responder
+
+
+def resource_query(name):
+    """Decorates a function to handle RESTful HTTP queries for resources.
+    """
+
+    def make_responder(query_func):
+        def responder(queries):
+            return app.response_class(
+                json_generator(
+                    query_func(queries),
+                    root='results', expand=is_expand()
+                ),
+                mimetype='application/json'
+            )
+
+        responder.__name__ = 'query_{0}'.format(name)
+        return responder
+
+    return make_responder
+
+
+def resource_list(name):
+    """Decorates a function to handle RESTful HTTP request for a list of
+    resources.
+    """
+
+    def make_responder(list_all):
+        def responder():
+            return app.response_class(
+                json_generator(list_all(), root=name, expand=is_expand()),
+                mimetype='application/json'
+            )
+
+        responder.__name__ = 'all_{0}'.format(name)
+        return responder
+
+    return make_responder
+
+
+def _field_index():
+    if 'field_index' not in app.config:
+        app.config['field_index'] = FieldIndex(app.config['lib'])
+    return app.config['field_index']
+
+
+def _get_unique_table_field_values(model, field, sort_field):
+    """ retrieve all unique values belonging to a key from a model """
+    # Computed and flexible fields have no column to select.
+    if field not in model._fields or sort_field not in model._fields:
+        raise KeyError
+    if field == sort_field:
+        return _field_index().values(model, field)
+    with g.lib.transaction() as tx:
+        rows = tx.query('SELECT DISTINCT "{0}" FROM "{1}" ORDER BY "{2}"'
+                        .format(field, model._table, sort_field))
+    return [row[0] for row in rows]
+
+
+class IdListConverter(BaseConverter):
+    """Converts comma separated lists of ids in urls to integer lists.
+    """
+
+    def to_python(self, value):
+        ids = []
+        for id in value.split(','):
+            try:
+                ids.append(int(id))
+            except ValueError:
+                pass
+        return ids
+
+    def to_url(self, value):
+        return ','.join(value)
+
+
+class QueryConverter(PathConverter):
+    """Converts slash separated lists of queries in the url to string list.
+    """
+
+    def to_python(self, value):
+        return value.split('/')
+
+    def to_url(self, value):
+        return ','.join(value)
+
+
+class EverythingConverter(PathConverter):
+    regex = '.*?'
+
+
+class TaskEncoder(JSONEncoder):
+
+    def default(self, o):
+        if isinstance(o, SingletonImportTask):
+            return {
+                'artist': o.item.artist,
+                'title': o.item.title,
+                'rec': o.rec.name if o.rec is not None else None,
+                'match': self.default(o.match),
+                'candidates': self.default(o.candidates),
+                'imported_items': o.imported_items() if
+                hasattr(o, 'found_duplicates') else None,
+                'found_duplicates': self.default(o.found_duplicates) if
+                hasattr(o, 'found_duplicates') else None,
+            }
+        if isinstance(o, ImportTask):
+            return {
+                'candidates': self.default(o.candidates),
+                'match': self.default(o.match),
+                'rec': o.rec.name if o.rec is not None else None,
+                'cur_album': o.cur_album,
+                'cur_artist': o.cur_artist,
+                'is_album': o.is_album,
+                'items': self.default(o.items),
+                'paths': [str(p) for p in o.paths],
+                # 'toppath': o.toppath,
+                'imported_items': o.imported_items() if
+                hasattr(o, 'found_duplicates') else None,
+                'found_duplicates': self.default(o.found_duplicates) if
+                hasattr(o, 'found_duplicates') else None,
+            }
+        if isinstance(o, CandidateList):
+            return self.default(o.full) + self.default(o.summaries)
+        if isinstance(o, CandidateSummary):
+            return {
+                'distance': {
+                    'distance': o.distance,
+                    'penalties': list(o.penalties),
+                    'tracks': dict(),
+                },
+                'info': o.info,
+                'summary': True,
+            }
+        if isinstance(o, AlbumMatch):
+            return {
+                'distance': self.default(o.distance),
+                'info': o.info,
+                'mapping': [(self.default(key), value)
+                            for key, value in o.mapping.items()],
+                'extra_tracks': o.extra_tracks
+            }
+        if isinstance(o, TrackMatch):
+            return {
+                'distance': self.default(o.distance),
+                'info': o.info,
+            }
+        if isinstance(o, Distance):
+            return {
+                'distance': o.distance,
+                'penalties': o.keys(),
+                'tracks': dict((x.track_id, self.default(y))
+                               for x, y in o.tracks.items())
+                if hasattr(o, 'tracks') else dict()
+            }
+        if isinstance(o, list):
+            return [self.default(x) for x in o]
+        if isinstance(o, AlbumInfo):
+            return o.__dict__
+        if isinstance(o, beets.library.Item):
+            return {
+                'title': o.title.strip(),
+                'path': o.path,
+                'track': o.track,
+                'format': o.format,
+                'bitrate': o.bitrate,
+                'filesize': o.filesize,
+                'length': o.length
+            }
+        if isinstance(o, beets.library.Album):
+            return {
+                'items': self.default(list(o.items()))
+            }
+        return str(o)
+
+
+def _task_filter(args):
+    """Build a predicate for the task filters given in the request
+    arguments: `rec` (comma separated recommendation names),
+    `duplicates` (true/false) and `kind` (album/singleton).
+    """
+    recs = args.get('rec')
+    if recs is not None:
+        recs = set(recs.split(','))
+    duplicates = args.get('duplicates')
+    if duplicates is not None:
+        duplicates = duplicates.lower() in ('1', 'true', 'yes')
+    kind = args.get('kind')
+
+    def matches(task):
+        if recs is not None and \
+                (task.rec.name if task.rec is not None else 'none') \
+                not in recs:
+            return False
+        if duplicates is not None and \
+                bool(getattr(task, 'found_duplicates', None)) != duplicates:
+            return False
+        if kind == 'album' and isinstance(task, SingletonImportTask):
+            return False
+        if kind == 'singleton' and \
+                not isinstance(task, SingletonImportTask):
+            return False
+        return True
+
+    return matches
+
+
+def _project(data, fields):
+    """Reduce the JSON representation `data` to `fields`. Nested keys are
+    separated by dots and apply to every element of a list, so
+    `candidates.info` keeps only the info of each candidate.
+    """
+    if isinstance(data, list):
+        return [_project(x, fields) for x in data]
+    if not isinstance(data, dict):
+        return data
+    nested = dict()
+    for field in fields:
+        key, _, rest = field.partition('.')
+        if rest:
+            nested.setdefault(key, []).append(rest)
+        else:
+            nested[key] = None
+    return dict((key, data[key] if sub is None else _project(data[key], sub))
+                for key, sub in nested.items() if key in data)
+
+
+def _encode_task(session, task_id, task):
+    """Return the encoded JSON of `task`, from the session's cache if the
+    task did not change since it was last encoded.
+    """
+    return session.json_cache.get(
+        task_id, session.versions.get(task_id),
+        lambda: json.dumps(task, cls=TaskEncoder, separators=(',', ':')))
+
+
+def _task_json(session, task_id, task, fields=None):
+    """Return the encoded JSON of `task`, projected to `fields` if given.
+    """
+    encoded = _encode_task(session, task_id, task)
+    if not fields:
+        return encoded
+    return json.dumps(_project(json.loads(encoded), fields),
+                      separators=(',', ':'))
+
+
+def _json_object(pairs):
+    """Join `(key, encoded JSON)` pairs to the encoded JSON object."""
+    return '{' + ','.join('{0}:{1}'.format(json.dumps(key), value)
+                          for key, value in pairs) + '}'
+
+
+def _fields():
+    fields = request.args.get('fields')
+    if fields:
+        return fields.split(',')
+    return None
+
+
+# Flask setup.
+
+app = flask.Flask(__name__)
+app.url_map.converters['idlist'] = IdListConverter
+app.url_map.converters['query'] = QueryConverter
+app.url_map.converters['everything'] = EverythingConverter
+app.json_encoder = TaskEncoder
+# The static files are linked with their modification time, so a changed
+# file gets a new URL and the browser may keep the old one for long.
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 365 * 24 * 60 * 60
+
+jobs = JobRunner()
+searches = SearchRunner()
+registry = SessionRegistry([jobs, searches])
+
+
+def session_route(rule, **options):
+    """Register the decorated view at `/api<rule>` for the current
+    session and at `/api/sessions/<session_id><rule>` for any session.
+    The view is called with the session, None if there is no current
+    one. Unknown session ids are answered with 404, and views that change
+    the session run while holding its lock.
+    """
+    locked = any(m != 'GET' for m in options.get('methods', ['GET']))
+
+    def decorator(view):
+        def responder(session_id=None, **kwargs):
+            g.session_id = session_id
+            entry = registry.get(session_id, g.lib)
+            if entry is None:
+                if session_id is not None:
+                    return flask.abort(404)
+                return view(None, **kwargs)
+            if not locked:
+                return view(entry.session, **kwargs)
+            with entry.lock:
+                return view(entry.session, **kwargs)
+
+        responder.__name__ = view.__name__
+        app.add_url_rule('/api' + rule, view_func=responder, **options)
+        app.add_url_rule('/api/sessions/<session_id>' + rule,
+                         view_func=responder, **options)
+        return responder
+
+    return decorator
+
+
+def _start_session(paths):
+    """Start a session scanning `paths`. A session for the same paths
+    keeps its id, so that it takes over the stored pending tasks and only
+    rescans directories that changed; if it is still scanning or
+    importing, it is returned instead.
+    """
+    normalized = sorted(util.normpath(path) for path in paths)
+    session_id = None
+    for entry in registry.entries():
+        if sorted(entry.session.paths) == normalized:
+            if entry.busy:
+                return entry.session
+            session_id = entry.session.id
+            entry.session.close()
+            break
+    snapshot = session_snapshot()
+    if session_id is None and snapshot is not None:
+        session_id = snapshot.find(normalized)
+    session = WebImporter(g.lib, None, paths, None, session_id)
+    registry.add(session)
+    session.job = jobs.submit(session)
+    return session
+
+
+def _session_info(session):
+    return {
+        'id': session.id,
+        'paths': [util.displayable_path(path) for path in session.paths],
+        'state': session.job.state if session.job else session.state,
+        'pending': len(session.tasks),
+        'current': session.id == registry.current,
+    }
+
+
+def _render_import(session_id=None):
+    api_base = request.script_root + '/api'
+    if session_id is not None:
+        api_base += '/sessions/' + session_id
+    return flask.render_template('import.html', api_base=api_base)
+
+
+@app.before_request
+def before_request():
+    g.lib = app.config['lib']
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def after_request(response):
+    start = g.get('request_start')
+    if start is not None:
+        rule = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics().observe(REQUEST_SECONDS, time.perf_counter() - start,
+                          route=rule, method=request.method)
+    return response
+
+
+@app.url_defaults
+def static_version(endpoint, values):
+    if endpoint != 'static' or 'filename' not in values:
+        return
+    try:
+        mtime = os.stat(os.path.join(app.static_folder, values['filename']))
+    except OSError:
+        return
+    values['v'] = int(mtime.st_mtime)
+
+
+@app.after_request
+def compress(response):
+    if not app.config.get('COMPRESSION', True):
+        return response
+    return compress_response(response,
+                             choose_encoding(request.accept_encodings))
+
+
+# The counters in the ETags start over with the process, so the ETags of
+# an earlier process must not match.
+_ETAG_NONCE = uuid.uuid4().hex
+
+
+def _etag(*parts):
+    """Return a strong ETag for a response that depends on nothing but
+    `parts` and the request arguments.
+    """
+    key = repr((_ETAG_NONCE,) + parts +
+               (sorted(request.args.items(multi=True)),))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:24]
+
+
+def _not_modified(etag):
+    """Return a `304 Not Modified` response if the client already has
+    the response with `etag`, in any encoding, otherwise None.
+    """
+    tags = request.if_none_match
+    if not tags:
+        return None
+    if not any(tags.contains(etag + suffix)
+               for suffix in ('', '-gzip', '-br')):
+        return None
+    response = app.response_class(status=304)
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
+
+
+def _conditional(response, etag):
+    """Give `response` the `etag` and make clients revalidate it."""
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
+
+
+@app.route('/', methods=['GET', 'POST'])
+def run_import():
+    if request.method == 'GET':
+        return _render_import()
+    elif request.method == 'POST':
+        form = request.form
+        if not form or 'path' not in form or not type(form['path']) is str:
+            return "paths must be a set"
+        session = _start_session([form['path']])
+        return _render_import(session.id)
+
+
+@app.route('/sessions/<session_id>')
+def show_session(session_id):
+    if registry.get(session_id, g.lib) is None:
+        return flask.abort(404)
+    return _render_import(session_id)
+
+
+@app.route('/api/sessions', methods=['GET', 'POST'])
+def import_sessions():
+    """List the registered sessions, or start a new one for the `path`
+    given in the JSON body.
+    """
+    if request.method == 'POST':
+        data = request.get_json()
+        if not data or not isinstance(data.get('path'), str):
+            return flask.abort(400)
+        session = _start_session([data['path']])
+        return jsonify(_session_info(session)), 201
+    registry.evict()
+    return jsonify([_session_info(s) for s in registry.sessions()])
+
+
+@app.route('/api/sessions/<session_id>', methods=['DELETE'])
+def remove_session(session_id):
+    if not registry.remove(session_id):
+        return flask.abort(404)
+    return app.response_class(status=204)
+
+
+@app.route('/api/metrics')
+def get_metrics():
+    """Serve the pipeline and route timings, the pending and importing
+    tasks of each session and the lookup counts in the Prometheus text
+    format.
+    """
+    samples = []
+    for session in registry.sessions():
+        samples.append(('webimport_pending_tasks', {'session': session.id},
+                        len(session.tasks)))
+        samples.append(('webimport_importing_tasks',
+                        {'session': session.id}, session.importing))
+    broker = lookup_broker().stats()
+    samples.append(('webimport_lookups_total', {}, broker['calls']))
+    samples.append(('webimport_lookups_coalesced_total', {},
+                    broker['coalesced']))
+    return app.response_class(metrics().render(samples),
+                              mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/values/<model>/<field>')
+def field_values(model, field):
+    """List the distinct values of an item or album field, or with the
+    `prefix` argument those starting with it, at most `limit` of them.
+    """
+    if model not in MODELS:
+        return flask.abort(404)
+    etag = _etag('values', g.lib.revision, model, field)
+    not_modified = _not_modified(etag)
+    if not_modified:
+        return not_modified
+    prefix = request.args.get('prefix')
+    limit = request.args.get('limit', None, type=int)
+    try:
+        if prefix is None:
+            values = _get_unique_table_field_values(MODELS[model], field,
+                                                    field)[:limit]
+        else:
+            values = _field_index().prefixed(MODELS[model], field, prefix,
+                                             limit)
+    except KeyError:
+        return flask.abort(404)
+    return _conditional(jsonify({'values': values}), etag)
+
+
+@session_route('/job')
+def get_job(session):
+    if session and session.job:
+        return jsonify(session.job.as_dict(session))
+    return jsonify(None)
+
+
+@session_route('/<task_id>')
+def import_info(session, task_id):
+    task = session.tasks.get(task_id) if session else None
+    if task is None:
+        return flask.abort(404)
+    etag = _etag(session.id, task_id, session.versions.get(task_id))
+    not_modified = _not_modified(etag)
+    if not_modified:
+        return not_modified
+    return _conditional(app.response_class(
+        _task_json(session, task_id, task, _fields()),
+        mimetype='application/json'), etag)
+
+
+@session_route('/<task_id>/candidates/<int:index>')
+def task_candidate(session, task_id, index):
+    """Return a candidate of a task in full, also one that the task
+    lists only as a summary.
+    """
+    task = session.tasks.get(task_id) if session else None
+    if task is None:
+        return flask.abort(404)
+    with session.tasks.lock(task_id):
+        if not 0 <= index < len(task.candidates):
+            return flask.abort(404)
+        candidate = task.candidates[index]
+    return jsonify(TaskEncoder().default(candidate))
+
+
+@session_route('/tasks')
+def get_tasks(session):
+    if session:
+        # Read the sequence number first, so that a client following
+        # /api/events from it sees every change not in the snapshot.
+        seq = session.events.seq
+        etag = _etag(session.id, seq)
+        not_modified = _not_modified(etag)
+        if not_modified:
+            not_modified.headers['X-Event-Seq'] = str(seq)
+            return not_modified
+        # The import job adds tasks while this request is served.
+        tasks = session.tasks.snapshot()
+        matches = _task_filter(request.args)
+        selected = [(task_id, task) for task_id, task in tasks.items()
+                    if matches(task)]
+        offset = request.args.get('offset', 0, type=int)
+        limit = request.args.get('limit', None, type=int)
+        end = offset + limit if limit is not None else None
+        fields = _fields()
+        response = app.response_class(
+            _json_object((task_id, _task_json(session, task_id, task, fields))
+                         for task_id, task in selected[offset:end]),
+            mimetype='application/json')
+        response.headers['X-Event-Seq'] = str(seq)
+        response.headers['X-Total-Count'] = str(len(selected))
+        return _conditional(response, etag)
+    return jsonify([])
+
+
+@session_route('/cache')
+def cache_stats(session):
+    if session:
+        return jsonify(session.json_cache.stats())
+    return jsonify(None)
+
+
+@session_route('/memory')
+def memory_usage(session):
+    if session:
+        return jsonify(session.memory_usage())
+    return jsonify(None)
+
+
+@session_route('/events')
+def task_events(session):
+    """Stream task changes of the session as server-sent events. The
+    stream starts after the sequence number in the `Last-Event-ID` header
+    or the `since` argument; without either only new events are sent. A
+    `search` event reports a finished search job. A `reset` event tells
+    the client that it has to fetch /api/tasks again, which happens when
+    the session is removed or, for the current session, when another one
+    is started. Beyond `max_event_streams` open streams the answer is
+    `503`.
+    """
+    if not session:
+        return app.response_class(status=204)
+    release = open_stream()
+    if release is None:
+        return app.response_class(status=503, headers={'Retry-After': '30'})
+    since = request.headers.get('Last-Event-ID', request.args.get('since'))
+    try:
+        since = int(since)
+    except (TypeError, ValueError):
+        since = session.events.seq
+    follows_current = g.session_id is None
+
+    def alive():
+        # A new scan of the same paths replaces the session under its id.
+        entry = registry.get(None if follows_current else session.id)
+        return entry is not None and entry.session is session
+
+    def stream(seq):
+        # Servers send the headers with the first chunk.
+        yield ': connected\n\n'
+        while alive():
+            events = session.events.since(seq, timeout=15)
+            if events is None:
+                break
+            if not events:
+                yield ': keep-alive\n\n'
+                continue
+            for seq, kind, task_id in events:
+                data = [('task_id', json.dumps(task_id))]
+                if kind == SEARCH:
+                    job = searches.get(task_id)
+                    data = [('job', json.dumps(job.as_dict() if job
+                                               else {'id': task_id}))]
+                elif kind in (ADDED, CANDIDATES, CHANGED):
+                    task = session.tasks.get(task_id)
+                    if task is None:
+                        # Removed again, a later event reports that.
+                        continue
+                    data.append(('task',
+                                 _encode_task(session, task_id, task)))
+                yield 'id: {0}\nevent: {1}\ndata: {2}\n\n'.format(
+                    seq, kind, _json_object(data))
+        yield 'event: reset\ndata: {}\n\n'
+
+    response = app.response_class(stream(since),
+                                  mimetype='text/event-stream',
+                                  headers={'Cache-Control': 'no-cache'})
+    response.call_on_close(release)
+    return response
+
+
+@session_route('/candidate', methods=['PUT'])
+def import_choose_candidate(session):
+    data = request.get_json()
+    session.choose_candidate(data['task_index'], data['candidate_index'])
+    return jsonify(session.tasks.get(data['task_index']))
+
+
+@session_route('/skip', methods=['PUT'])
+def import_skip(session):
+    data = request.get_json()
+    task = session.skip_task(data['task_index'])
+    return jsonify(task)
+
+
+def _submit_search(session, data, **query):
+    """Start a search job for the task in `data` and answer with it."""
+    if not session or data['task_index'] not in session.tasks:
+        return flask.abort(404)
+    timeout = data.get('timeout')
+    if not isinstance(timeout, (int, float)):
+        timeout = None
+    job = searches.submit(session, data['task_index'], timeout=timeout,
+                          **query)
+    return jsonify(job.as_dict()), 202
+
+
+@session_route('/searchId', methods=['PUT'])
+def search_id(session):
+    data = request.get_json()
+    return _submit_search(session, data, search_ids=data['id'].split())
+
+
+@session_route('/searchName', methods=['PUT'])
+def search_name(session):
+    data = request.get_json()
+    return _submit_search(session, data, artist=data['artist'],
+                          name=data['name'])
+
+
+@session_route('/searches')
+def search_jobs(session):
+    if not session:
+        return jsonify([])
+    return jsonify([job.as_dict() for job in searches.jobs(session)])
+
+
+@session_route('/searches/<job_id>', methods=['GET', 'DELETE'])
+def search_job(session, job_id):
+    """Report the state of a search job, or cancel it."""
+    job = searches.get(job_id)
+    if job is None or job.session is not session:
+        return flask.abort(404)
+    if request.method == 'DELETE':
+        job.cancel()
+    return jsonify(job.as_dict())
+
+
+@session_route('/asIs', methods=['PUT'])
+def import_as_is(session):
+    data = request.get_json()
+    with session.tasks.lock(data['task_index']):
+        task = session.tasks[data['task_index']]
+        task.set_choice(action.ASIS)
+        if session.resolved_duplicates(data['task_index']):
+            session.import_task(data['task_index'])
+            return jsonify(task), 202
+        return jsonify(task)
+
+
+@session_route('/asTracks', methods=['PUT'])
+def import_as_tracks(session):
+    data = request.get_json()
+    with session.tasks.lock(data['task_index']):
+        task = session.tasks[data['task_index']]
+        task.set_choice(action.TRACKS)
+        session.as_tracks(data['task_index'])
+        return jsonify(task)
+
+
+@session_route('/resolveDuplicates', methods=['PUT'])
+def import_resolve_duplicates(session):
+    data = request.get_json()
+    with session.tasks.lock(data['task_index']):
+        task = session.tasks[data['task_index']]
+        if not task.match:
+            task.set_choice(task.candidates[0])
+
+        sel = data['duplicate_action']
+        if sel == u'k':
+            # Keep both. Do nothing; leave the choice intact.
+            pass
+        elif sel == u'r':
+            # Remove old.
+            task.should_remove_duplicates = True
+        elif sel == u'm':
+            session.merge_duplicates(data['task_index'])
+            return jsonify([])
+
+        session.import_task(data['task_index'])
+        return jsonify(task)
+
+
+@session_route('/apply', methods=['PUT'])
+def import_apply(session):
+    data = request.get_json()
+    with session.tasks.lock(data['task_index']):
+        task = session.tasks[data['task_index']]
+        if not task.match:
+            task.set_choice(task.candidates[0])
+        if session.resolved_duplicates(data['task_index']):
+            session.import_task(data['task_index'])
+            return jsonify(task), 202
+        return jsonify(task)
+
+
+@session_route('/progress')
+def import_progress(session):
+    """Report the file operations of the tasks handed to the import
+    pipeline: their state and how many files and bytes are done. Only the
+    last finished tasks are kept.
+    """
+    if session:
+        return jsonify(session.progress_report())
+    return jsonify(None)
+
+
+def _is_decision(data):
+    """Whether `data` is a dict with a task id and, if any, an integer
+    candidate index.
+    """
+    if not isinstance(data, dict) or \
+            not isinstance(data.get('task_index'), str):
+        return False
+    index = data.get('candidate_index')
+    return index is None or \
+        (isinstance(index, int) and not isinstance(index, bool))
+
+
+@session_route('/batch', methods=['PUT'])
+def import_batch(session):
+    """Carry out a list of `{task_index, action, candidate_index}`
+    decisions, `action` being `apply`, `asIs` or `skip`, in one pipeline
+    run. If any of them cannot be carried out, none is and the answer is
+    `400` with the `invalid` ones.
+    """
+    data = request.get_json()
+    if not isinstance(data, list) or not all(map(_is_decision, data)):
+        return flask.abort(400)
+    decisions = [(d['task_index'], d.get('action', 'apply'),
+                  d.get('candidate_index')) for d in data]
+    if any(a not in ('apply', 'asIs', 'skip') for _, a, _ in decisions):
+        return flask.abort(400)
+    return _decided(session.decide(decisions))
+
+
+def _decided(result):
+    """Answer with the `result` of `WebImporter.decide`."""
+    if result['invalid']:
+        return jsonify(result), 400
+    return jsonify(result)
+
+
+@session_route('/applyStrong', methods=['PUT'])
+def import_apply_strong(session):
+    """Apply the best candidate to all tasks with a strong
+    recommendation.
+    """
+    return _decided(session.decide(session.strong_decisions()))
+
+
+@session_route('/policy', methods=['GET', 'POST'])
+def import_policy(session):
+    """Report which pending tasks each `auto_apply` rule would decide
+    on, without deciding. A POST tries the rules in its `rules` list
+    instead of the configured ones.
+    """
+    if session is None:
+        return jsonify(None)
+    policy = session.policy
+    if request.method == 'POST':
+        try:
+            policy = ApplyPolicy.from_list(
+                (request.get_json() or {}).get('rules'))
+        except ValueError as exc:
+            return flask.abort(400, str(exc))
+    return jsonify(policy.dry_run(session))
+
+
+@session_route('/policy', methods=['PUT'])
+def import_policy_apply(session):
+    """Let the `auto_apply` rules decide on the pending tasks."""
+    return _decided(session.decide(session.policy.decisions(session)))
+
+
+# Plugin hook.
+
+class WebImportPlugin(BeetsPlugin):
+    def __init__(self):
+        super(WebImportPlugin, self).__init__()
+        self.config.add({
+            'host': u'127.0.0.1',
+            'port': 8337,
+            'cors': '',
+            'cors_supports_credentials': False,
+            'reverse_proxy': False,
+            'include_paths': False,
+            'lookup_workers': 1,
+            'cache_path': u'',
+            'lookup_cache': True,
+            'lookup_cache_ttl': 7 * 24 * 60 * 60,
+            'lookup_cache_size': 10000,
+            'resume': True,
+            'io_concurrency': 2,
+            'scan_workers': 2,
+            'session_timeout': 60 * 60,
+            'max_sessions': 8,
+            'scan_index': True,
+            'read_workers': 1,
+            'lookup_rate': 0,
+            'lookup_burst': 1,
+            'search_workers': 2,
+            'search_timeout': 30,
+            'max_candidates': 0,
+            'compact_candidates': True,
+            'profile': u'',
+            'compression': True,
+            'server': u'werkzeug',
+            'server_threads': 16,
+            'max_event_streams': 8,
+            'server_backlog': 1024,
+            'server_keep_alive': 30,
+            'shutdown_timeout': 60,
+            'auto_apply': [],
+        })
+        for event in ('item_moved', 'item_copied', 'item_linked',
+                      'item_hardlinked', 'item_reflinked'):
+            self.register_listener(event, self.file_done)
+        self.register_listener('item_imported', self.imported)
+        self.register_listener('album_imported', self.imported)
+
+    def file_done(self, item, source, destination):
+        for session in registry.sessions():
+            session.file_done(item)
+
+    def imported(self, lib, item=None, album=None):
+        index = app.config.get('field_index')
+        if index is not None:
+            index.add(album or item)
+        for session in registry.sessions():
+            session.duplicates.add(album or item)
+
+    def commands(self):
+        cmd = ui.Subcommand('webimport', help=u'start a import web interface')
+        cmd.parser.add_option(u'-d', u'--debug', action='store_true',
+                              default=False, help=u'debug mode')
+        cmd.parser.add_option(u'--profile', dest='profile', metavar='DIR',
+                              help=u'write a flame graph profile of every '
+                                   u'import session to DIR')
+
+        def func(lib, opts, args):
+            args = ui.decargs(args)
+            if args:
+                self.config['host'] = args.pop(0)
+            if args:
+                self.config['port'] = int(args.pop(0))
+            if opts.profile:
+                self.config['profile'] = opts.profile
+
+            app.config['lib'] = lib
+            # Normalizes json output
+            app.config['JSONIFY_PRETTYPRINT_REGULAR'] = False
+
+            app.config['INCLUDE_PATHS'] = self.config['include_paths']
+            app.config['COMPRESSION'] = self.config['compression'].get(bool)
+            app.config['field_index'] = FieldIndex(lib)
+            try:
+                apply_policy()
+            except ValueError as exc:
+                raise ui.UserError(u'webimport: auto_apply: {0}'.format(exc))
+
+            # Pick up the pending tasks of the last session.
+            # Sessions without pending tasks are dropped.
+            snapshot = session_snapshot()
+            if snapshot:
+                snapshot.prune()
+            if snapshot and snapshot.sessions():
+                session = WebImporter.resumed(lib, snapshot.sessions()[0])
+                if session and len(session.tasks):
+                    registry.add(session)
+                elif session:
+                    snapshot.forget(session.id)
+
+            # Enable CORS if required.
+            if self.config['cors']:
+                self._log.info(u'Enabling CORS with origin: {0}',
+                               self.config['cors'])
+                from flask_cors import CORS
+                app.config['CORS_ALLOW_HEADERS'] = "Content-Type"
+                app.config['CORS_RESOURCES'] = {
+                    r"/*": {"origins": self.config['cors'].get(str)}
+                }
+                CORS(
+                    app,
+                    supports_credentials=self.config[
+                        'cors_supports_credentials'
+                    ].get(bool)
+                )
+
+            # Allow serving behind a reverse proxy
+            if self.config['reverse_proxy']:
+                app.wsgi_app = ReverseProxied(app.wsgi_app)
+
+            # Start the web application.
+            serve(app, self.config['host'].as_str(),
+                  self.config['port'].get(int), opts.debug)
+            # Let the imports started from the page finish their files.
+            drain(registry.sessions(),
+                  self.config['shutdown_timeout'].get(int))
+
+        cmd.func = func
+        return [cmd]
+
+
+class ReverseProxied(object):
+    '''Wrap the application in this middleware and configure the
+    front-end server to add these headers, to let you quietly bind
+    this to a URL other than / and to an HTTP scheme that is
+    different than what is used locally.
+
+    In nginx:
+    location /myprefix {
+        proxy_pass http://192.168.0.1:5001;
+        proxy_set_header Host $host;
+        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+        proxy_set_header X-Scheme $scheme;
+        proxy_set_header X-Script-Name /myprefix;
+        }
+
+    From: http://flask.pocoo.org/snippets/35/
+
+    :param app: the WSGI application
+    '''
+
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        script_name = environ.get('HTTP_X_SCRIPT_NAME', '')
+        if script_name:
+            environ['SCRIPT_NAME'] = script_name
+            path_info = environ['PATH_INFO']
+            if path_info.startswith(script_name):
+                environ['PATH_INFO'] = path_info[len(script_name):]
+
+        scheme = environ.get('HTTP_X_SCHEME', '')
+        if scheme:
+            environ['wsgi.url_scheme'] = scheme
+        return self.app(environ, start_response)
@@ -0,0 +1,92 @@
+"""Check the lookup broker against the stub metadata source: the rate
+limit, coalescing of identical searches, and searches of users going
+before background lookups.
+
+    python benchmarks/bench_broker.py --rate 5
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from beets import config, library  # noqa: E402
+
+from synthetic import StubSource, make_inbox  # noqa: E402
+
+
+def albums(inbox, count):
+    dirs = make_inbox(inbox, count, 2)
+    return [[library.Item.from_path(os.path.join(d, f).encode())
+             for f in sorted(os.listdir(d))] for d in dirs]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rate', type=float, default=5)
+    parser.add_argument('--lookups', type=int, default=15)
+    parser.add_argument('--searchers', type=int, default=10)
+    opts = parser.parse_args()
+
+    config.read(user=False, defaults=True)
+    from beetsplug.webimport import WebImportPlugin
+    from beetsplug.webimport.WebImporter import WebImporter
+    WebImportPlugin()
+    config['webimport']['lookup_cache'] = False
+    config['webimport']['lookup_rate'] = opts.rate
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config['webimport']['cache_path'] = os.path.join(tmp, 'webimport.db')
+        config['statefile'] = os.path.join(tmp, 'state.pickle')
+        lib = library.Library(os.path.join(tmp, 'library.db'), tmp)
+        session = WebImporter(lib, None, [tmp.encode()], None)
+        background = albums(os.path.join(tmp, 'inbox'), opts.lookups)
+        searched = albums(os.path.join(tmp, 'searched'), 1)[0]
+
+        # Background lookups of distinct albums obey the rate limit.
+        with StubSource() as stub:
+            start = time.perf_counter()
+            for items in background:
+                session.tag_album(items)
+            elapsed = time.perf_counter() - start
+        print('{0} lookups at lookup_rate={1}: {2:.2f}s, {3:.1f}/s'.format(
+            stub.calls, opts.rate, elapsed, stub.calls / elapsed))
+
+        # Identical searches running at the same time are made once.
+        with StubSource(latency=0.5) as stub:
+            threads = [threading.Thread(
+                target=session.query_source,
+                args=(searched, False, True),
+                kwargs={'artist': u'Artist 0', 'name': u'Album 0'})
+                for _ in range(opts.searchers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        print('{0} identical searches: {1} source call(s)'.format(
+            opts.searchers, stub.calls))
+
+        # A search waits for the next token, not for the backlog.
+        with StubSource():
+            thread = threading.Thread(
+                target=lambda: [session.tag_album(items)
+                                for items in background])
+            thread.start()
+            # Arrive between two tokens of the background lookups.
+            time.sleep(1 + 0.5 / opts.rate)
+            start = time.perf_counter()
+            session.query_source(searched, False, True,
+                                 artist=u'Artist 1', name=u'Album 1')
+            waited = time.perf_counter() - start
+            thread.join()
+        print('search during {0} background lookups waited {1:.2f}s '
+              '(one token: {2:.2f}s)'.format(opts.lookups, waited,
+                                             1 / opts.rate))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Compare the candidate lookup of `WebImporter.run` with one and with
+several `lookup_workers` against a slow stub metadata source.
+
+    python benchmarks/bench_lookup.py --albums 40 --latency 0.2 --workers 8
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from beets import config, library  # noqa: E402
+
+from synthetic import StubSource, make_inbox  # noqa: E402
+
+
+def run(lib, inbox, workers):
+    from beetsplug.webimport.WebImporter import WebImporter
+    config['webimport']['lookup_workers'] = workers
+    session = WebImporter(lib, None, [inbox.encode()], None)
+    start = time.perf_counter()
+    session.run()
+    return time.perf_counter() - start, session
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--albums', type=int, default=40)
+    parser.add_argument('--tracks', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--workers', type=int, default=8)
+    opts = parser.parse_args()
+
+    config.read(user=False, defaults=True)
+    from beetsplug.webimport import WebImportPlugin
+    WebImportPlugin()
+    # Every run has to query the stub source and read the tags.
+    config['webimport']['lookup_cache'] = False
+    config['webimport']['resume'] = False
+    config['webimport']['scan_index'] = False
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config['webimport']['cache_path'] = os.path.join(tmp, 'webimport.db')
+        config['statefile'] = os.path.join(tmp, 'state.pickle')
+        inbox = os.path.join(tmp, 'inbox')
+        make_inbox(inbox, opts.albums, opts.tracks)
+        lib = library.Library(os.path.join(tmp, 'library.db'),
+                              os.path.join(tmp, 'music'))
+        with StubSource(opts.latency):
+            serial, _ = run(lib, inbox, 1)
+            parallel, session = run(lib, inbox, opts.workers)
+
+    print('albums: {0}, latency: {1}s'.format(opts.albums, opts.latency))
+    print('lookup_workers=1: {0:.2f}s'.format(serial))
+    print('lookup_workers={0}: {1:.2f}s ({2:.1f}x)'.format(
+        opts.workers, parallel, serial / parallel))
+    print('pending tasks: {0}'.format(len(session.tasks)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Compare the memory held by the pending tasks of a session with full
+candidates, with compact candidates and with compact candidates capped by
+`max_candidates`, using the stub source with several candidates per
+album.
+
+    python benchmarks/bench_memory.py --albums 200 --candidates 10
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from beets import config, library  # noqa: E402
+
+from synthetic import StubSource, make_inbox  # noqa: E402
+
+
+def scan(lib, inbox, compact, limit):
+    from beetsplug.webimport.WebImporter import WebImporter
+    config['webimport']['compact_candidates'] = compact
+    config['webimport']['max_candidates'] = limit
+    session = WebImporter(lib, None, [inbox.encode()], None)
+    start = time.perf_counter()
+    session.run()
+    elapsed = time.perf_counter() - start
+    best = [task.candidates[0].info.album_id
+            for _, task in sorted(session.tasks.items())]
+    return elapsed, session.memory_usage(), best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--albums', type=int, default=200)
+    parser.add_argument('--tracks', type=int, default=10)
+    parser.add_argument('--candidates', type=int, default=10)
+    parser.add_argument('--max', type=int, default=3)
+    opts = parser.parse_args()
+
+    config.read(user=False, defaults=True)
+    from beetsplug.webimport import WebImportPlugin
+    WebImportPlugin()
+    config['webimport']['lookup_cache'] = False
+    config['webimport']['resume'] = False
+    config['webimport']['scan_index'] = False
+    # Keep every task pending instead of applying strong matches.
+    config['import']['timid'] = True
+
+    runs = [('full', False, 0), ('compact', True, 0),
+            ('compact, max_candidates={0}'.format(opts.max), True, opts.max)]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp, \
+            StubSource(candidates=opts.candidates):
+        inbox = os.path.join(tmp, 'inbox')
+        make_inbox(inbox, opts.albums, opts.tracks)
+        lib = library.Library(os.path.join(tmp, 'library.db'),
+                              os.path.join(tmp, 'music'))
+        for name, compact, limit in runs:
+            results.append((name,) + scan(lib, inbox, compact, limit))
+
+    print('albums: {0}, tracks: {1}, candidates: {2}'.format(
+        opts.albums, opts.tracks, opts.candidates))
+    baseline = results[0][2]['task_bytes']
+    for name, elapsed, usage, best in results:
+        print('{0}: {1:.1f} MiB in tasks ({2:.1f}x smaller), '
+              '{3} candidates kept, {4:.2f}s, same best: {5}'.format(
+                  name, usage['task_bytes'] / 2 ** 20,
+                  baseline / usage['task_bytes'], usage['candidates'],
+                  elapsed, best == results[0][3]))
+
+
+if __name__ == '__main__':
+    main()
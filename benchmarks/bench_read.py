@@ -0,0 +1,77 @@
+"""Compare scanning a synthetic inbox with one and with several
+`read_workers`. `--latency` adds a delay to every file read, standing in
+for a slow disk or a network mount.
+
+    python benchmarks/bench_read.py --albums 100 --latency 0.01 --workers 8
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from beets import config, library  # noqa: E402
+from beets.importer import ImportTaskFactory  # noqa: E402
+
+from synthetic import make_inbox  # noqa: E402
+
+
+def slow_reads(latency):
+    """Delay `ImportTaskFactory.read_item` by `latency` seconds."""
+    read_item = ImportTaskFactory.read_item
+
+    def slow_read_item(self, path):
+        time.sleep(latency)
+        return read_item(self, path)
+
+    ImportTaskFactory.read_item = slow_read_item
+
+
+def scan(lib, inbox, workers):
+    from beetsplug.webimport.WebImporter import WebImporter
+    config['webimport']['read_workers'] = workers
+    session = WebImporter(lib, None, [inbox.encode()], None)
+    session.set_config(config['import'])
+    start = time.perf_counter()
+    tasks = [task for task in session.read_tasks() if not task.skip]
+    return time.perf_counter() - start, tasks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--albums', type=int, default=100)
+    parser.add_argument('--tracks', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--workers', type=int, default=8)
+    opts = parser.parse_args()
+
+    config.read(user=False, defaults=True)
+    from beetsplug.webimport import WebImportPlugin
+    WebImportPlugin()
+    # Every run has to read the files.
+    config['webimport']['scan_index'] = False
+    if opts.latency:
+        slow_reads(opts.latency)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        inbox = os.path.join(tmp, 'inbox')
+        make_inbox(inbox, opts.albums, opts.tracks)
+        lib = library.Library(os.path.join(tmp, 'library.db'),
+                              os.path.join(tmp, 'music'))
+        serial, serial_tasks = scan(lib, inbox, 1)
+        parallel, parallel_tasks = scan(lib, inbox, opts.workers)
+
+    same = [t.paths for t in serial_tasks] == [t.paths for t in parallel_tasks]
+    print('albums: {0}, tracks: {1}, latency: {2}s'.format(
+        opts.albums, opts.tracks, opts.latency))
+    print('read_workers=1: {0:.2f}s'.format(serial))
+    print('read_workers={0}: {1:.2f}s ({2:.1f}x)'.format(
+        opts.workers, parallel, serial / parallel))
+    print('same order: {0}'.format(same))
+
+
+if __name__ == '__main__':
+    main()
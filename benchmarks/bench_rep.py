@@ -0,0 +1,108 @@
+"""Measure how fast `json_generator` lists the albums of a generated
+library, with their items, and all items on their own, against the previous one-query-per-album,
+one-stat-per-item implementation.
+
+    python benchmarks/bench_rep.py --albums 2000 --tracks 10
+"""
+import argparse
+import base64
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from beets import config, library, util  # noqa: E402
+
+
+def make_library(root, albums, tracks):
+    """Add `albums` albums of `tracks` items each to a library in `root`,
+    backed by small files.
+    """
+    lib = library.Library(os.path.join(root, 'library.db'), root)
+    with lib.transaction():
+        for album in range(albums):
+            items = []
+            for track in range(1, tracks + 1):
+                path = os.path.join(root, '{0}-{1}.mp3'.format(album, track))
+                with open(path, 'wb') as f:
+                    f.write(b'\0' * track)
+                items.append(library.Item(
+                    path=path.encode(), title=u'Track {0}'.format(track),
+                    artist=u'Artist {0}'.format(album),
+                    album=u'Album {0}'.format(album), track=track,
+                    mtime=os.path.getmtime(path)))
+            lib.add_album(items)
+    return lib
+
+
+def baseline_rep(obj, expand=False):
+    out = dict(obj)
+    if isinstance(obj, library.Item):
+        del out['path']
+        for key, value in out.items():
+            if isinstance(out[key], bytes):
+                out[key] = base64.b64encode(value).decode('ascii')
+        try:
+            out['size'] = os.path.getsize(util.syspath(obj.path))
+        except OSError:
+            out['size'] = 0
+        return out
+    del out['artpath']
+    if expand:
+        out['items'] = [baseline_rep(item) for item in obj.items()]
+    return out
+
+
+def baseline_generator(items, root, expand=False):
+    yield '{"%s":[' % root
+    first = True
+    for item in items:
+        if first:
+            first = False
+        else:
+            yield ','
+        yield json.dumps(baseline_rep(item, expand=expand))
+    yield ']}'
+
+
+def measure(generator, lib, kind):
+    start = time.perf_counter()
+    if kind == 'albums':
+        data = ''.join(generator(lib.albums(), 'albums', expand=True))
+    else:
+        data = ''.join(generator(lib.items(), 'items'))
+    return time.perf_counter() - start, data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--albums', type=int, default=2000)
+    parser.add_argument('--tracks', type=int, default=10)
+    opts = parser.parse_args()
+
+    config.read(user=False, defaults=True)
+    from beetsplug.webimport import json_generator
+
+    with tempfile.TemporaryDirectory() as tmp:
+        lib = make_library(tmp, opts.albums, opts.tracks)
+        print('albums: {0}, tracks: {1}'.format(opts.albums, opts.tracks))
+        for kind, count in (('albums', opts.albums),
+                            ('items', opts.albums * opts.tracks)):
+            before, expected = measure(baseline_generator, lib, kind)
+            cold, data = measure(json_generator, lib, kind)
+            warm, _ = measure(json_generator, lib, kind)
+            print('{0}, one at a time: {1:.2f}s ({2:.0f}/s)'.format(
+                kind, before, count / before))
+            for name, elapsed in (('batched', cold),
+                                  ('batched, sizes cached', warm)):
+                print('{0}, {1}: {2:.2f}s ({3:.0f}/s, {4:.1f}x)'.format(
+                    kind, name, elapsed, count / elapsed, before / elapsed))
+            print('{0}, same output: {1}'.format(
+                kind, json.loads(data) == json.loads(expected)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+"""Run the importer and the web API against a synthetic inbox and the stub
+metadata source, and print the results as JSON so they can be compared
+between commits:
+
+- scan: time for `WebImporter.run` to scan and look up the inbox, and the
+  lookups made per second;
+- tasks: latency and payload size of `/api/tasks`, the first (uncached)
+  request and the following ones, for all tasks and for one page;
+- search: time for `/api/searchName` to answer and for its job to finish;
+- apply: time to import tasks applied with `/api/apply`;
+- the peak resident set size of the process.
+
+    python benchmarks/bench_suite.py --albums 200 --latency 0.01 > new.json
+    python benchmarks/bench_suite.py --compare old.json new.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from beets import config, library  # noqa: E402
+
+from synthetic import StubSource, make_inbox  # noqa: E402
+
+
+def percentiles(samples):
+    """Summarize the seconds in `samples` in milliseconds."""
+    samples = sorted(samples)
+
+    def at(fraction):
+        return round(samples[int(fraction * (len(samples) - 1))] * 1000, 3)
+
+    return {'min_ms': at(0), 'median_ms': at(0.5), 'p95_ms': at(0.95),
+            'max_ms': at(1)}
+
+
+def peak_rss_kib():
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, KiB elsewhere.
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(__file__),
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def wait_for(check, timeout=600, interval=0.01):
+    deadline = time.perf_counter() + timeout
+    while not check():
+        if time.perf_counter() > deadline:
+            raise RuntimeError(u'timed out')
+        time.sleep(interval)
+
+
+def bench_scan(client, base, inbox, stub):
+    start = time.perf_counter()
+    response = client.post('/api/sessions', json={'path': inbox})
+    session_id = response.get_json()['id']
+    api = '{0}/sessions/{1}'.format(base, session_id)
+
+    def done():
+        return client.get(api + '/job').get_json()['state'] in \
+            ('done', 'failed')
+
+    wait_for(done)
+    elapsed = time.perf_counter() - start
+    job = client.get(api + '/job').get_json()
+    return api, {
+        'seconds': round(elapsed, 3),
+        'state': job['state'],
+        'tasks': job['pending'],
+        'lookups': stub.calls,
+        'lookups_per_second': round(stub.calls / elapsed, 2),
+    }
+
+
+def bench_tasks(client, api, repeat):
+    result = dict()
+    # The page goes first, its first request encodes its tasks.
+    for name, url in (('page', api + '/tasks?limit=50'),
+                      ('all', api + '/tasks')):
+        times = []
+        for _ in range(repeat + 1):
+            start = time.perf_counter()
+            response = client.get(url)
+            body = response.get_data()
+            times.append(time.perf_counter() - start)
+        result[name] = {
+            'first_ms': round(times[0] * 1000, 3),
+            'cached': percentiles(times[1:]),
+            'bytes': len(body),
+        }
+    return result
+
+
+def bench_search(client, api, task_ids, repeat):
+    submit = []
+    complete = []
+    for task_id in task_ids[:repeat]:
+        start = time.perf_counter()
+        job = client.put(api + '/searchName', json={
+            'task_index': task_id, 'artist': u'Searched',
+            'name': u'Album ' + task_id}).get_json()
+        submit.append(time.perf_counter() - start)
+        url = '{0}/searches/{1}'.format(api, job['id'])
+        wait_for(lambda: client.get(url).get_json()['state'] not in
+                 ('queued', 'running'), interval=0.001)
+        complete.append(time.perf_counter() - start)
+    return {'searches': len(submit), 'submit': percentiles(submit),
+            'complete': percentiles(complete)}
+
+
+def bench_apply(client, api, session, task_ids):
+    start = time.perf_counter()
+    for task_id in task_ids:
+        client.put(api + '/apply', json={'task_index': task_id})
+    session.wait(600)
+    elapsed = time.perf_counter() - start
+    return {'tasks': len(task_ids), 'seconds': round(elapsed, 3),
+            'tasks_per_second': round(len(task_ids) / elapsed, 2)}
+
+
+def run(opts):
+    config.read(user=False, defaults=True)
+    import beetsplug.webimport as webimport
+    webimport.WebImportPlugin()
+    config['import']['copy'] = True
+    # Keep every task pending instead of applying strong matches.
+    config['import']['timid'] = True
+    config['webimport']['lookup_workers'] = opts.workers
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config['webimport']['cache_path'] = os.path.join(tmp, 'webimport.db')
+        inbox = os.path.join(tmp, 'inbox')
+        make_inbox(inbox, opts.albums, opts.tracks)
+        lib = library.Library(os.path.join(tmp, 'library.db'),
+                              os.path.join(tmp, 'music'))
+        webimport.app.config['lib'] = lib
+        client = webimport.app.test_client()
+        with StubSource(opts.latency) as stub:
+            api, scan = bench_scan(client, '/api', inbox, stub)
+            session = webimport.registry.get(api.rsplit('/', 1)[1]).session
+            task_ids = sorted(session.tasks.snapshot(), key=int)
+            tasks = bench_tasks(client, api, opts.repeat)
+            search = bench_search(client, api, task_ids, opts.searches)
+            applied = bench_apply(client, api, session,
+                                  task_ids[:opts.apply])
+    return {
+        'meta': {
+            'commit': commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'albums': opts.albums,
+            'tracks': opts.tracks,
+            'latency': opts.latency,
+            'lookup_workers': opts.workers,
+        },
+        'scan': scan,
+        'tasks': tasks,
+        'search': search,
+        'apply': applied,
+        'peak_rss_kib': peak_rss_kib(),
+    }
+
+
+def flatten(data, prefix=''):
+    out = dict()
+    for key, value in data.items():
+        if isinstance(value, dict):
+            out.update(flatten(value, prefix + key + '.'))
+        elif isinstance(value, (int, float)) and \
+                not isinstance(value, bool):
+            out[prefix + key] = value
+    return out
+
+
+def compare(old_path, new_path):
+    """Print the numbers of two result files side by side."""
+    with open(old_path) as f:
+        old = flatten(json.load(f))
+    with open(new_path) as f:
+        new = flatten(json.load(f))
+    for key in sorted(set(old) & set(new)):
+        if key.startswith('meta.'):
+            continue
+        change = ''
+        if old[key]:
+            change = '{0:+.1f}%'.format((new[key] / old[key] - 1) * 100)
+        print('{0:<36} {1:>12} {2:>12} {3:>9}'.format(key, old[key],
+                                                      new[key], change))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--albums', type=int, default=100)
+    parser.add_argument('--tracks', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.01)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=20,
+                        help=u'requests of /api/tasks after the first')
+    parser.add_argument('--searches', type=int, default=5)
+    parser.add_argument('--apply', type=int, default=20,
+                        help=u'tasks to import')
+    parser.add_argument('--output', help=u'file to write the JSON to')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help=u'compare two result files instead')
+    opts = parser.parse_args()
+
+    if opts.compare:
+        compare(*opts.compare)
+        return
+    result = json.dumps(run(opts), indent=2, sort_keys=True)
+    if opts.output:
+        with open(opts.output, 'w') as f:
+            f.write(result + '\n')
+    else:
+        print(result)
+
+
+if __name__ == '__main__':
+    main()
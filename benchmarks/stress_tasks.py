@@ -0,0 +1,154 @@
+"""Hammer a scanning `WebImporter` with apply, skip and search decisions
+from several threads and check that every task ends up exactly once as
+pending, imported or skipped. The searches run as search jobs and replace
+the candidates of the tasks they find still pending.
+
+    python benchmarks/stress_tasks.py --albums 60 --threads 8
+"""
+import argparse
+import collections
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from beets import config, library  # noqa: E402
+
+from synthetic import StubSource, make_inbox  # noqa: E402
+
+
+def hammer(session, searches, scanning, rng, errors):
+    """Decide on random pending tasks until the scan is over and no task
+    is left. A task is left alone while it is searched, like a user waits
+    for the new candidates; the other tasks are decided on meanwhile.
+    """
+    while scanning.is_set() or len(session.tasks):
+        searched = set(job.task_id for job in searches.jobs(session)
+                       if not job.over)
+        pending = [task_id for task_id in session.tasks.snapshot()
+                   if task_id not in searched]
+        if not pending:
+            time.sleep(0.001)
+            continue
+        task_id = rng.choice(pending)
+        try:
+            choice = rng.random()
+            if choice < 0.3:
+                session.decide([(task_id, 'apply', None)])
+            elif choice < 0.5:
+                session.skip_task(task_id)
+            elif choice < 0.7:
+                session.choose_candidate(task_id, 0)
+            elif choice < 0.85:
+                searches.submit(session, task_id, artist=u'Searched Artist',
+                                name=u'Searched Album')
+            else:
+                session.decide([(task_id, 'asIs', None)])
+        except Exception:
+            errors.append(traceback.format_exc())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--albums', type=int, default=60)
+    parser.add_argument('--tracks', type=int, default=2)
+    parser.add_argument('--latency', type=float, default=0.005)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=0)
+    opts = parser.parse_args()
+
+    config.read(user=False, defaults=True)
+    from beetsplug.webimport import WebImportPlugin
+    from beetsplug.webimport.SearchJob import DONE, SearchRunner
+    from beetsplug.webimport.WebImporter import WebImporter
+    WebImportPlugin()
+    config['webimport']['lookup_cache'] = False
+    config['webimport']['resume'] = False
+    config['webimport']['lookup_workers'] = 4
+    # Keep every task pending instead of applying strong matches.
+    config['import']['timid'] = True
+
+    errors = []
+    with tempfile.TemporaryDirectory() as tmp:
+        config['webimport']['cache_path'] = os.path.join(tmp, 'webimport.db')
+        config['statefile'] = os.path.join(tmp, 'state.pickle')
+        inbox = os.path.join(tmp, 'inbox')
+        make_inbox(inbox, opts.albums, opts.tracks)
+        lib = library.Library(os.path.join(tmp, 'library.db'),
+                              os.path.join(tmp, 'music'))
+        session = WebImporter(lib, None, [inbox.encode()], None)
+        searches = SearchRunner()
+        scanning = threading.Event()
+        scanning.set()
+
+        def scan():
+            try:
+                session.run()
+            except Exception:
+                errors.append(traceback.format_exc())
+            finally:
+                scanning.clear()
+
+        start = time.perf_counter()
+        with StubSource(opts.latency):
+            threads = [threading.Thread(target=scan)] + [
+                threading.Thread(target=hammer,
+                                 args=(session, searches, scanning,
+                                       random.Random(opts.seed + i), errors))
+                for i in range(opts.threads)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            jobs = searches.jobs(session)
+            for job in jobs:
+                if job.future is not None:
+                    job.future.result()
+            session.wait()
+            session.close()
+        elapsed = time.perf_counter() - start
+
+    outcomes = collections.defaultdict(list)
+    added = []
+    for _, kind, task_id in session.events.since(0):
+        if kind == 'added':
+            added.append(task_id)
+        elif kind in ('imported', 'skipped'):
+            outcomes[task_id].append(kind)
+    for task_id in session.tasks.snapshot():
+        outcomes[task_id].append('pending')
+    problems = []
+    if len(set(added)) != len(added):
+        problems.append('task ids handed out twice')
+    for task_id in added:
+        if len(outcomes[task_id]) != 1:
+            problems.append('task {0}: {1}'.format(task_id,
+                                                   outcomes[task_id] or
+                                                   'lost'))
+
+    print('albums: {0}, threads: {1}, {2:.2f}s'.format(
+        opts.albums, opts.threads, elapsed))
+    print('tasks: {0}, imported: {1}, skipped: {2}'.format(
+        len(added),
+        sum(o == ['imported'] for o in outcomes.values()),
+        sum(o == ['skipped'] for o in outcomes.values())))
+    print('searches: {0}, changed candidates: {1}'.format(
+        len(jobs), sum(job.state == DONE and bool(job.candidates)
+                       for job in jobs)))
+    for error in errors:
+        print(error)
+    for problem in problems:
+        print(problem)
+    if errors or problems:
+        sys.exit(1)
+    print('ok')
+
+
+if __name__ == '__main__':
+    main()
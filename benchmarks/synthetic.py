@@ -0,0 +1,89 @@
+"""Synthetic inboxes and a stub metadata source for the benchmarks."""
+import os
+import time
+
+from beets.autotag import hooks
+from beets.autotag.hooks import AlbumInfo, TrackInfo
+from mediafile import MediaFile
+
+# A silent MPEG-1 Layer III frame (128 kbps, 44.1 kHz, no padding).
+MP3_FRAME = b'\xff\xfb\x90\x64' + b'\x00' * 413
+
+
+def make_inbox(root, albums, tracks, frames=40):
+    """Write `albums` directories of `tracks` tagged MP3 files each below
+    `root` and return the list of album directories.
+    """
+    dirs = []
+    for album in range(albums):
+        path = os.path.join(root, 'album{0:05d}'.format(album))
+        os.makedirs(path, exist_ok=True)
+        for track in range(1, tracks + 1):
+            filename = os.path.join(path, '{0:02d}.mp3'.format(track))
+            with open(filename, 'wb') as f:
+                f.write(MP3_FRAME * frames)
+            mf = MediaFile(filename)
+            mf.artist = mf.albumartist = u'Artist {0}'.format(album)
+            mf.album = u'Album {0}'.format(album)
+            mf.title = u'Track {0}'.format(track)
+            mf.track = track
+            mf.tracktotal = tracks
+            mf.save()
+        dirs.append(path)
+    return dirs
+
+
+class StubSource(object):
+    """Replaces the metadata source lookups of `beets.autotag.hooks` with
+    local ones that take `latency` seconds and return `candidates` albums,
+    the first matching the searched metadata.
+    """
+
+    def __init__(self, latency=0.0, candidates=1):
+        self.latency = latency
+        self.candidates = candidates
+        self.calls = 0
+        self._saved = None
+
+    def album_candidates(self, items, artist, album, va_likely,
+                         extra_tags=None):
+        self.calls += 1
+        time.sleep(self.latency)
+        for n in range(self.candidates):
+            suffix = u' ({0})'.format(n) if n else u''
+            tracks = [TrackInfo(title=item.title + suffix,
+                                track_id=u't{0}-{1}'.format(n, i),
+                                index=i + 1, length=item.length)
+                      for i, item in enumerate(items)]
+            yield AlbumInfo(tracks=tracks, album=album + suffix,
+                            album_id=u'stub-{0}{1}'.format(album, suffix),
+                            artist=artist, artist_id=u'stub-' + artist,
+                            data_source=u'Stub')
+
+    def item_candidates(self, item, artist, title):
+        self.calls += 1
+        time.sleep(self.latency)
+        yield TrackInfo(title=title, track_id=u'stub-' + title,
+                        artist=artist, length=item.length)
+
+    def album_for_mbid(self, album_id):
+        self.calls += 1
+        time.sleep(self.latency)
+        return None
+
+    def track_for_mbid(self, track_id):
+        self.calls += 1
+        time.sleep(self.latency)
+        return None
+
+    def __enter__(self):
+        names = ('album_candidates', 'item_candidates', 'album_for_mbid',
+                 'track_for_mbid')
+        self._saved = dict((name, getattr(hooks, name)) for name in names)
+        for name in names:
+            setattr(hooks, name, getattr(self, name))
+        return self
+
+    def __exit__(self, *exc_info):
+        for name, func in self._saved.items():
+            setattr(hooks, name, func)
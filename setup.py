@@ -1,57 +1,61 @@
-#!/usr/bin/env python
-# -*- coding: utf-8 -*-
-
-# This file is part of beets.
-# Copyright 2016, Adrian Sampson.
-#
-# Permission is hereby granted, free of charge, to any person obtaining
-# a copy of this software and associated documentation files (the
-# "Software"), to deal in the Software without restriction, including
-# without limitation the rights to use, copy, modify, merge, publish,
-# distribute, sublicense, and/or sell copies of the Software, and to
-# permit persons to whom the Software is furnished to do so, subject to
-# the following conditions:
-#
-# The above copyright notice and this permission notice shall be
-# included in all copies or substantial portions of the Software.
-
-from setuptools import setup
-
-setup(
-    name='beets-web-import',
-    version='0.0.2',
-    description='web import interface for beets',
-    author='Joris Jensen',
-    author_email='mrnuggelz@gmx.de',
-    url='https://beets.io/',
-    license='MIT',
-    platforms='ALL',
-    zip_safe=False,
-    include_package_data=True,  # Install plugin resources.
-
-    packages=[
-        'beetsplug.webimport'
-    ],
-
-    install_requires=[
-        'beets',
-        'flask'
-    ],
-
-    classifiers=[
-        'Topic :: Multimedia :: Sound/Audio',
-        'Topic :: Multimedia :: Sound/Audio :: Players :: MP3',
-        'License :: OSI Approved :: MIT License',
-        'Environment :: Console',
-        'Environment :: Web Environment',
-        'Programming Language :: Python',
-        'Programming Language :: Python :: 2',
-        'Programming Language :: Python :: 2.7',
-        'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
-        'Programming Language :: Python :: 3.7',
-        'Programming Language :: Python :: 3.8',
-        'Programming Language :: Python :: Implementation :: CPython',
-    ],
-)
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of beets.
+# Copyright 2016, Adrian Sampson.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+from setuptools import setup
+
+setup(
+    name='beets-web-import',
+    version='0.0.2',
+    description='web import interface for beets',
+    author='Joris Jensen',
+    author_email='mrnuggelz@gmx.de',
+    url='https://beets.io/',
+    license='MIT',
+    platforms='ALL',
+    zip_safe=False,
+    include_package_data=True,  # Install plugin resources.
+
+    packages=[
+        'beetsplug.webimport'
+    ],
+
+    install_requires=[
+        'beets',
+        'flask'
+    ],
+
+    extras_require={
+        'waitress': ['waitress>=2.0'],
+    },
+
+    classifiers=[
+        'Topic :: Multimedia :: Sound/Audio',
+        'Topic :: Multimedia :: Sound/Audio :: Players :: MP3',
+        'License :: OSI Approved :: MIT License',
+        'Environment :: Console',
+        'Environment :: Web Environment',
+        'Programming Language :: Python',
+        'Programming Language :: Python :: 2',
+        'Programming Language :: Python :: 2.7',
+        'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3.5',
+        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: Implementation :: CPython',
+    ],
+)